@@ -0,0 +1,130 @@
+"""
+Asset manager for images and sound files
+
+Decoded images and raw file contents are kept in a bounded LRU cache,
+so a picture shown in several cutscenes is only decoded once.
+Assets that will be needed soon can be prefetched on a worker thread
+while the current scene is still showing.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+IMREAD_COLOR = 1  # cv2.IMREAD_COLOR, cv2 itself is only imported to decode the first image
+IMREAD_UNCHANGED = -1  # cv2.IMREAD_UNCHANGED, keeps the alpha channel
+
+
+def _check_exists(filename: str) -> None:
+    if not os.path.isfile(filename):
+        raise FileNotFoundError(f"asset file not found: {os.path.abspath(filename)}")
+
+
+def _load(key: tuple):
+    kind, filename, *args = key
+    _check_exists(filename)
+    if kind == "image":
+        import cv2
+
+        img = cv2.imread(filename, *args)
+        if img is None:
+            raise ValueError(f"could not decode image: {filename}")
+        img.flags.writeable = False  # cached images are shared, copy before drawing on them
+        return img
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def _size(asset) -> int:
+    return asset.nbytes if isinstance(asset, np.ndarray) else len(asset)
+
+
+class AssetManager:
+    """LRU cache of decoded assets with a byte budget"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()  # least recently used first
+        self.nbytes = 0
+        self.pending: dict[tuple, Future] = {}
+        self.lock = threading.Lock()
+        self.executor = None  # started by the first prefetch
+
+    def image(self, filename: str, flags: int = IMREAD_COLOR) -> np.ndarray:
+        """the decoded image, read-only"""
+        return self._get(("image", filename, flags))
+
+    def data(self, filename: str) -> bytes:
+        """the raw contents of a file, e.g. a song"""
+        return self._get(("data", filename))
+
+    def prefetch_image(self, filename: str, flags: int = IMREAD_COLOR) -> None:
+        self._prefetch(("image", filename, flags))
+
+    def prefetch_data(self, filename: str) -> None:
+        self._prefetch(("data", filename))
+
+    def _get(self, key: tuple):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            future = self.pending.get(key)
+        asset = future.result() if future else _load(key)
+        self._store(key, asset)
+        return asset
+
+    def _prefetch(self, key: tuple) -> None:
+        _check_exists(key[1])  # fail now, not when the scene is needed
+        with self.lock:
+            if key in self.cache or key in self.pending:
+                return
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assets")
+            future = self.executor.submit(_load, key)
+            self.pending[key] = future
+        future.add_done_callback(lambda f: self._prefetched(key, f))
+
+    def _prefetched(self, key: tuple, future: Future) -> None:
+        if future.exception() is None:
+            self._store(key, future.result())
+        else:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def _store(self, key: tuple, asset) -> None:
+        with self.lock:
+            self.pending.pop(key, None)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return
+            self.cache[key] = asset
+            self.nbytes += _size(asset)
+            # evict least recently used assets, but always keep the newest one
+            while self.nbytes > self.max_bytes and len(self.cache) > 1:
+                _, old = self.cache.popitem(last=False)
+                self.nbytes -= _size(old)
+
+
+# the asset manager shared by the whole game
+manager = AssetManager()
+
+
+def get_image(filename: str, flags: int = IMREAD_COLOR) -> np.ndarray:
+    return manager.image(filename, flags)
+
+
+def get_data(filename: str) -> bytes:
+    return manager.data(filename)
+
+
+def prefetch(*filenames: str) -> None:
+    """starts loading images (.png) and other files in the background"""
+    for filename in filenames:
+        if filename.endswith(".png"):
+            manager.prefetch_image(filename)
+        else:
+            manager.prefetch_data(filename)
@@ -0,0 +1,203 @@
+"""
+Audio for the Wild West game
+
+All sound runs on one background thread fed by a command queue, so
+loading and decoding a song never holds up a frame. Decoded music tracks
+and sound effects are kept in an LRU cache with a byte budget. Music
+plays on two reserved mixer channels: switching tracks fades the old one
+out while the new one fades in.
+
+The short sound effects are synthesized, so they need no files.
+Without an audio device the commands are dropped and the game stays silent.
+"""
+import io
+import queue
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from assets import get_data
+
+pygame = mixer = None  # imported by the audio thread, see _import_pygame()
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024  # a decoded 3 minute song takes about 30 MB
+CROSSFADE_MS = 800
+QUEUE_SIZE = 64  # sound effects beyond this many waiting commands are dropped
+
+
+def _import_pygame() -> None:
+    """pygame takes a while to import, the audio thread does it when the first command arrives"""
+    global pygame, mixer
+    import pygame
+    from pygame import mixer
+
+
+def _synthesize(name: str) -> np.ndarray:
+    """samples of a built-in sound effect for the current (signed) mixer format"""
+    frequency, size, channels = mixer.get_init()
+    rng = np.random.default_rng(0)
+    if name == "shot":  # a short crack of noise
+        t = np.arange(int(frequency * 0.12)) / frequency
+        wave = rng.uniform(-1, 1, len(t)) * np.exp(-t * 40)
+    elif name == "coin":  # two quick bright tones
+        t = np.arange(int(frequency * 0.08)) / frequency
+        wave = 0.5 * np.concatenate([np.sin(2 * np.pi * 988 * t), np.sin(2 * np.pi * 1319 * t)])
+    elif name == "hit":  # a low thump
+        t = np.arange(int(frequency * 0.2)) / frequency
+        wave = np.sin(2 * np.pi * 110 * t) * np.exp(-t * 15)
+    else:
+        raise KeyError(f"no sound effect called {name}")
+    samples = (wave * 0.8 * (2 ** (abs(size) - 1) - 1)).astype(f"int{abs(size)}")
+    if channels > 1:
+        samples = np.repeat(samples[:, np.newaxis], channels, axis=1)
+    return np.ascontiguousarray(samples)
+
+
+SOUND_EFFECTS = ("shot", "coin", "hit")
+
+
+class AudioManager:
+    """
+    plays music and sound effects on its own thread,
+    every method only puts a command into the queue and returns
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, crossfade_ms: int = CROSSFADE_MS):
+        self.max_bytes = max_bytes
+        self.crossfade_ms = crossfade_ms
+        self.commands = queue.Queue(maxsize=QUEUE_SIZE)
+        self.thread = None  # started by the first command
+        self.lock = threading.Lock()
+        # everything below is only used on the audio thread
+        self.cache = OrderedDict()  # decoded sounds, least recently used first
+        self.nbytes = 0
+        self.enabled = True  # False when there is no audio device
+        self.music_channels = []
+        self.music_channel = 0  # index of the channel with the current song
+        self.song = None
+        self.failed = set()  # sound files that could not be loaded, reported once and not tried again
+
+    #
+    # called from the game
+    #
+    def play_music(self, filename: str, fade_ms: int | None = None) -> None:
+        """loops the song, crossfading from the one playing; nothing happens if it plays already"""
+        self._send(("music", filename, self.crossfade_ms if fade_ms is None else fade_ms))
+
+    def stop_music(self, fade_ms: int | None = None) -> None:
+        self._send(("stop", self.crossfade_ms if fade_ms is None else fade_ms))
+
+    def play_sfx(self, name: str, volume: float = 1.0) -> None:
+        """plays a sound effect (see SOUND_EFFECTS) or sound file, dropped if the queue is full"""
+        self._send(("sfx", name, volume), drop=True)
+
+    def preload(self, filename: str) -> None:
+        """decodes a sound file now, so playing it later starts at once"""
+        self._send(("load", filename), drop=True)
+
+    def close(self, timeout: float = 1.0) -> None:
+        """stops the audio thread"""
+        if self.thread is not None:
+            self.commands.put(("quit",))
+            self.thread.join(timeout)
+            self.thread = None
+
+    def _send(self, command: tuple, drop: bool = False) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="audio", daemon=True)
+                self.thread.start()
+        try:
+            self.commands.put(command, block=not drop)
+        except queue.Full:
+            pass
+
+    #
+    # the audio thread
+    #
+    def _start_mixer(self) -> bool:
+        """imports pygame and opens the mixer, False when there is no sound"""
+        try:
+            _import_pygame()
+        except ImportError as e:
+            print(f"audio: no sound, {e}", file=sys.stderr)
+            return False
+        try:
+            if not mixer.get_init():
+                mixer.init()
+            mixer.set_num_channels(16)
+            mixer.set_reserved(2)
+            self.music_channels = [mixer.Channel(0), mixer.Channel(1)]
+        except pygame.error as e:
+            print(f"audio: no sound, {e}", file=sys.stderr)
+            return False
+        return True
+
+    def _run(self) -> None:
+        self.enabled = self._start_mixer()
+        while True:
+            command = self.commands.get()
+            if command[0] == "quit":
+                break
+            if not self.enabled or command[1] in self.failed:
+                continue
+            try:
+                getattr(self, "_" + command[0])(*command[1:])
+            except (pygame.error, OSError, KeyError) as e:
+                if isinstance(command[1], str):  # a file name, not the fade of "stop"
+                    self.failed.add(command[1])
+                print(f"audio: {command[0]} {command[1]} failed, {e}", file=sys.stderr)
+        if self.enabled:
+            for channel in self.music_channels:
+                channel.stop()
+
+    def _sound(self, name: str) -> "pygame.mixer.Sound":
+        """the decoded sound through the LRU cache"""
+        if name in self.cache:
+            self.cache.move_to_end(name)
+            return self.cache[name][0]
+        if name in SOUND_EFFECTS:
+            sound = pygame.sndarray.make_sound(_synthesize(name))
+        else:
+            sound = mixer.Sound(file=io.BytesIO(get_data(name)))
+        frequency, size, channels = mixer.get_init()
+        nbytes = int(sound.get_length() * frequency) * channels * abs(size) // 8
+        self.cache[name] = sound, nbytes
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes and len(self.cache) > 1:
+            old, (old_sound, old_nbytes) = self.cache.popitem(last=False)
+            if old == self.song:  # keep the song that is playing
+                self.cache[old] = old_sound, old_nbytes
+                continue
+            self.nbytes -= old_nbytes
+        return sound
+
+    def _load(self, filename: str) -> None:
+        self._sound(filename)
+
+    def _music(self, filename: str, fade_ms: int) -> None:
+        current = self.music_channels[self.music_channel]
+        if filename == self.song and current.get_busy():
+            return
+        sound = self._sound(filename)
+        current.fadeout(fade_ms)
+        self.music_channel = 1 - self.music_channel
+        self.music_channels[self.music_channel].play(sound, loops=-1, fade_ms=fade_ms)
+        self.song = filename
+
+    def _stop(self, fade_ms: int) -> None:
+        self.music_channels[self.music_channel].fadeout(fade_ms)
+        self.song = None
+
+    def _sfx(self, name: str, volume: float) -> None:
+        sound = self._sound(name)
+        channel = mixer.find_channel()  # None when all channels are busy, then it is skipped
+        if channel is not None:
+            channel.set_volume(volume)
+            channel.play(sound)
+
+
+# the audio of the game
+audio = AudioManager()
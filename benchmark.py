@@ -0,0 +1,245 @@
+"""
+Benchmarks for the core Wild West functions
+
+Times start_level, move_command, update, get_objects, get_changes, draw (into an
+offscreen frame), generate_land.create_land and create_land_fast on generated maps of
+several sizes and enemy densities. Everything is seeded, so two runs on
+the same machine measure the same work.
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json   # flags regressions
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import generate_land
+from level_files import compile_level
+from game_logic import WildWest, Player, Position, start_level, move_command, update, get_objects, get_changes
+
+SEED = 42
+SIZES = [10, 100, 1000]  # maps are SIZE x SIZE tiles
+ENEMY_DENSITIES = {"few": 0.01, "many": 0.1}  # share of tiles with an enemy
+LAND_SIZES = [10, 50, 100]
+FAST_LAND_SIZES = [100, 1000, 2000]
+THRESHOLD = 0.2  # 20% slower than the baseline counts as a regression
+MIN_RUN_TIME = 0.05  # seconds, short calls are repeated within a run
+
+ACTIONS = ["left", "right", "up", "down", "shot"]
+
+
+def make_level(size: int, enemy_density: float, seed: int = SEED) -> list[str]:
+    """a random level with walls, coins, traps, enemies, riders and one cave entrance"""
+    rng = np.random.default_rng(seed)
+    tiles = rng.choice(np.array(list(".#$T")), size=(size, size), p=[0.75, 0.15, 0.08, 0.02])
+    tiles[rng.random((size, size)) < enemy_density] = "E"
+    tiles[rng.random((size, size)) < enemy_density / 2] = "R"
+    tiles[0, size - 1] = "X"
+    tiles[size // 2, size // 2] = "."  # where the player starts
+    return ["".join(row) for row in tiles]
+
+
+def new_world(level: list[str]) -> WildWest:
+    size = len(level)
+    start = Position(x=size // 2, y=size // 2)
+    wildwest = WildWest(player=Player(position=start), seed=SEED)
+    start_level(wildwest, level, start)
+    return wildwest
+
+
+def timed(func, repeat: int, min_time: float = MIN_RUN_TIME) -> list[float]:
+    """
+    seconds per call of func() over `repeat` runs, every run calls func()
+    often enough to take at least min_time (the calibration warms up too)
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+#
+# the benchmarks, each returns the timings of one case
+#
+def bench_start_level(level, repeat):
+    wildwest = new_world(level)
+    start = Position(x=len(level) // 2, y=len(level) // 2)
+    return timed(lambda: start_level(wildwest, level, start), repeat)
+
+
+def bench_start_compiled(level, repeat):
+    """start_level from a compiled level, as loaded from a level file"""
+    wildwest = new_world(level)
+    compiled = compile_level(level)
+    start = Position(x=len(level) // 2, y=len(level) // 2)
+    return timed(lambda: start_level(wildwest, compiled, start), repeat)
+
+
+def bench_move_command(level, repeat):
+    wildwest = new_world(level)
+    actions = itertools.cycle(ACTIONS)
+    return timed(lambda: move_command(wildwest, wildwest.player, next(actions)), repeat)
+
+
+def bench_update(level, repeat):
+    wildwest = new_world(level)
+    return timed(lambda: update(wildwest), repeat)
+
+
+def bench_get_objects(level, repeat):
+    wildwest = new_world(level)
+    return timed(lambda: get_objects(wildwest), repeat)
+
+
+def bench_get_changes(level, repeat):
+    """the changes of one tick, as a renderer or network layer would fetch them every frame"""
+    wildwest = new_world(level)
+    actions = itertools.cycle(ACTIONS)
+    version = get_changes(wildwest, 0).version
+    times = []
+    for _ in range(repeat * 20):
+        update(wildwest)
+        move_command(wildwest, wildwest.player, next(actions))
+        start = time.perf_counter()
+        version = get_changes(wildwest, version).version
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_draw(level, repeat):
+    """
+    one steady-state frame: the world ticks, the player walks
+    (scrolling the camera), then the changed tiles are drawn
+    """
+    from renderer import Renderer, load_sprites
+
+    wildwest = new_world(level)
+    renderer = Renderer(load_sprites())
+    renderer.draw(wildwest)
+    actions = itertools.cycle(ACTIONS)
+    times = []
+    for _ in range(repeat * 20):
+        update(wildwest)
+        move_command(wildwest, wildwest.player, next(actions))
+        start = time.perf_counter()
+        renderer.draw(wildwest)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+BENCHMARKS = {
+    "start_level": bench_start_level,
+    "start_compiled": bench_start_compiled,
+    "move_command": bench_move_command,
+    "update": bench_update,
+    "get_objects": bench_get_objects,
+    "get_changes": bench_get_changes,
+    "draw": bench_draw,
+}
+
+
+def run(sizes: list[int], repeat: int, only: str = "") -> dict:
+    results = {}
+
+    def record(name, times):
+        if times is None:
+            return
+        results[name] = {
+            "median_s": statistics.median(times),
+            "min_s": min(times),
+            "repeat": len(times),
+        }
+        print(f"{name:<40} {results[name]['median_s'] * 1000:10.3f} ms", file=sys.stderr)
+
+    for size in sizes:
+        for density_name, density in ENEMY_DENSITIES.items():
+            level = make_level(size, density)
+            for bench_name, bench in BENCHMARKS.items():
+                name = f"{bench_name}/size={size}/enemies={density_name}"
+                if only in name:
+                    record(name, bench(level, repeat))
+
+    for size in LAND_SIZES:
+        name = f"create_land/size={size}"
+        if only in name:
+            random.seed(SEED)
+            record(name, timed(lambda: generate_land.create_land(size, size), repeat))
+    for size in FAST_LAND_SIZES:
+        name = f"create_land_fast/size={size}"
+        if only in name:
+            record(name, timed(lambda: generate_land.create_land_fast(size, size, SEED), repeat))
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float = THRESHOLD) -> list[str]:
+    """
+    names of the cases that got slower than the baseline by more than threshold,
+    compares the fastest runs as they are the least disturbed by other processes
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["min_s"] / baseline[name]["min_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:<40} {ratio:6.2f}x baseline{flag}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Wild West core functions")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="only run cases whose name contains this")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved earlier")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.only)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,40 @@
 """
 Download example music file from opengameart.org
+
+Cutscenes: a picture with text and music. One CutscenePlayer keeps the
+window for the whole session, renders the picture of a scene once and
+then sleeps in cv2.waitKey until a key is pressed or the scene's time is
+up. A sequence of scenes plays without a gap, the next picture is loaded
+and rendered on a worker thread while the current one is showing. The music is played by
+the audio thread, it keeps playing when the next scene has the same song.
 """
 import string
-from pygame import mixer
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
 import cv2
+from assets import get_image, prefetch as prefetch_assets
+from audio import audio
+
+WINDOW = "Cutscene"
 
 
-def cutscene(text: str, songfile: str, imagefile: str, wait: int = 3):
-    # start music
-    mixer.init()
-    mixer.music.load(songfile)
-    mixer.music.play(loops=-1)
+class Scene(NamedTuple):
+    text: str
+    songfile: str
+    imagefile: str
+    wait: float | None = 3  # seconds until the scene ends by itself, None: until a key is pressed
 
-    # show the image
-    img = cv2.imread(imagefile)  # sometimes returns None
-    assert img is not None
-    # show text
+
+def render(scene: Scene) -> np.ndarray:
+    """the picture of a scene with its text, the cached image stays untouched"""
+    img = get_image(scene.imagefile).copy()
     img[-100:] = 0
     img = cv2.putText(
         img,
-        text[:47],
+        scene.text[:47],
         org=(15, 490),
         fontFace=cv2.FONT_HERSHEY_SIMPLEX,
         fontScale=1,
@@ -28,20 +43,102 @@ def cutscene(text: str, songfile: str, imagefile: str, wait: int = 3):
     )
     img = cv2.putText(
         img,
-        text[47:],
+        scene.text[47:],
         org=(15, 530),
         fontFace=cv2.FONT_HERSHEY_SIMPLEX,
         fontScale=1,
         color=(255, 255, 255),
         thickness=2,
     )
-    cv2.imshow("Cutscene", img)
+    return img
+
 
-    # wait for user input
+def _printable(key: int) -> str | None:
+    if key != -1 and chr(key & 0xFF) in string.printable:
+        return chr(key & 0xFF)
+    return None
+
+
+def wait_for_key(seconds: float | None) -> str | None:
+    """
+    the next printable key, or None when `seconds` are up;
+    cv2.waitKey sleeps until a key arrives, so this does not use the CPU
+    """
+    deadline = None if seconds is None else time.perf_counter() + seconds
     while True:
-        key = chr(cv2.waitKey(1) & 0xFF)
-        if key in string.printable:
-            break
-        # time.sleep (wait)
-    cv2.destroyAllWindows()
-    mixer.music.stop()
\ No newline at end of file
+        if deadline is None:
+            timeout = 0  # forever
+        else:
+            timeout = round((deadline - time.perf_counter()) * 1000)
+            if timeout <= 0:
+                return None
+        key = _printable(cv2.waitKey(timeout))
+        if key:
+            return key
+
+
+class CutscenePlayer:
+    """plays cutscenes in one window"""
+
+    def __init__(self, window: str = WINDOW):
+        self.window = window
+        self.window_open = False
+        self.executor = None  # renders the next scene, started by the first sequence
+
+    def _show(self, scene: Scene, frame: np.ndarray) -> str | None:
+        """
+        puts the frame on screen right away, HighGUI only paints inside waitKey;
+        returns a key pressed meanwhile
+        """
+        cv2.imshow(self.window, frame)
+        self.window_open = True
+        audio.play_music(scene.songfile)
+        return _printable(cv2.waitKey(1))
+
+    def play(self, scene: Scene, prefetch: tuple[str, ...] = ()) -> str | None:
+        """
+        shows one scene and returns the key that ended it (None if its time ran out),
+        the files in `prefetch` (e.g. of the next scene) are loaded in the background meanwhile
+        """
+        frame = render(scene)
+        prefetch_assets(*prefetch)
+        return self._show(scene, frame) or wait_for_key(scene.wait)
+
+    def play_sequence(self, scenes: list[Scene], prefetch: tuple[str, ...] = ()) -> None:
+        """plays the scenes one after another, then closes the cutscene"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cutscene")
+        frame = render(scenes[0])
+        for i, scene in enumerate(scenes):
+            following = scenes[i + 1] if i + 1 < len(scenes) else None
+            next_frame = None
+            if following:
+                # the next picture is decoded and rendered while this scene is showing
+                next_frame = self.executor.submit(render, following)
+                audio.preload(following.songfile)
+            else:
+                prefetch_assets(*prefetch)
+            if not self._show(scene, frame):
+                wait_for_key(scene.wait)
+            frame = next_frame.result() if next_frame else None
+        self.close()
+
+    def close(self) -> None:
+        """fades out the music and closes the window"""
+        if self.window_open:
+            cv2.destroyWindow(self.window)
+            self.window_open = False
+        audio.stop_music()
+
+
+player = CutscenePlayer()
+
+
+def cutscene(text: str, songfile: str, imagefile: str, wait: float | None = 3, prefetch: tuple[str, ...] = ()):
+    """
+    shows a picture with text until a key is pressed or `wait` seconds passed,
+    the files in `prefetch` (e.g. of the next cutscene)
+    are loaded in the background meanwhile
+    """
+    player.play(Scene(text, songfile, imagefile, wait), prefetch)
+    player.close()
@@ -0,0 +1,269 @@
+"""
+Endless desert: a Wild West world without edges
+
+The world is split into chunks of CHUNK_SIZE x CHUNK_SIZE tiles. A chunk is
+generated by generate_land from the world seed and its chunk coordinates,
+so it comes out the same every time and only has to exist while the
+player is near it. The WildWest holds a window of VIEW_CHUNKS x VIEW_CHUNKS
+chunks around the player as an ordinary level. When the player walks into
+another chunk, the window is stored back into the chunks and moved.
+
+Generated chunks are kept in an LRU cache with a byte budget. What the
+player changed (coins picked up, riders and enemies that moved or were
+shot) is kept as the difference to the generated chunk, so an evicted
+chunk comes back as it was left. With a `delta_dir` the differences are
+files that outlive the world. Without one they are kept in memory up to
+their own byte budget, and the least recently used ones go to a
+temporary directory from there, removed again by close(). Either way
+memory stays the same however far the player travels.
+"""
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+import generate_land
+from game_logic import ENEMY_HEALTH
+from level_files import TILES
+
+CHUNK_SIZE = 32
+VIEW_CHUNKS = 3  # the player's chunk and one chunk around it
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_DELTA_BYTES = 1024 * 1024  # changed chunks kept in memory without a delta_dir
+DELTA_OVERHEAD = 400  # bytes of a delta besides its array data: three arrays and the dict entry
+EMPTY = ord(".")
+
+# tiles that never change, and tiles of things that move or get removed
+GROUND = "#T"
+UNITS = "$RE"
+# share of the floor tiles that get one of these
+SCATTER = {"$": 0.03, "T": 0.01, "R": 0.004, "E": 0.01}
+
+
+def generate_chunk(seed: int, cx: int, cy: int, size: int = CHUNK_SIZE) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ground tiles, unit tiles and enemy health of chunk (cx, cy)
+    as (size, size) arrays of tile characters, always the same for the same seed
+    """
+    rng = np.random.default_rng((seed, cx % 2**32, cy % 2**32))
+    floor = generate_land.generate_floor_grid(size, size, int(rng.integers(2**63)))
+    ground = np.where(floor, EMPTY, ord("#")).astype(np.uint8)
+    units = np.full((size, size), EMPTY, np.uint8)
+    roll = rng.random((size, size))
+    low = 0.0
+    for tile, share in SCATTER.items():
+        where = floor & (roll >= low) & (roll < low + share)
+        (ground if tile in GROUND else units)[where] = ord(tile)
+        low += share
+    health = np.where(units == ord("E"), ENEMY_HEALTH, 0).astype(np.int16)
+    return ground, units, health
+
+
+def _delta_size(delta: tuple[np.ndarray, np.ndarray, np.ndarray]) -> int:
+    return sum(a.nbytes for a in delta) + DELTA_OVERHEAD
+
+
+class EndlessWorld:
+    """
+    the chunks of an endless world and the window of them loaded into a WildWest
+
+    Positions in the WildWest are relative to the window,
+    world_position() turns them into world tile coordinates.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        chunk_size: int = CHUNK_SIZE,
+        view_chunks: int = VIEW_CHUNKS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        delta_dir: str | None = None,
+        max_delta_bytes: int = DEFAULT_MAX_DELTA_BYTES,
+    ):
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.view_chunks = view_chunks
+        self.max_bytes = max_bytes
+        self.delta_dir = delta_dir
+        self.max_delta_bytes = max_delta_bytes
+        self.cache = OrderedDict()  # generated chunks, least recently used first
+        self.nbytes = 0
+        # changed chunks when there is no delta_dir, least recently used first,
+        # the ones over max_delta_bytes are in spill_dir
+        self.deltas = OrderedDict()
+        self.delta_bytes = 0
+        self.spill_dir = None  # made when the first delta is spilled
+        self.origin = (0, 0)  # chunk in the top left corner of the window
+        if delta_dir:
+            os.makedirs(delta_dir, exist_ok=True)
+
+    def close(self) -> None:
+        """removes the spilled deltas, the world can't be used any more"""
+        if self.spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+        self.deltas.clear()
+        self.delta_bytes = 0
+
+    #
+    # chunks
+    #
+    def generated(self, cx: int, cy: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """the chunk as generated, through the LRU cache"""
+        key = (cx, cy)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        chunk = generate_chunk(self.seed, cx, cy, self.chunk_size)
+        self.cache[key] = chunk
+        self.nbytes += sum(a.nbytes for a in chunk)
+        while self.nbytes > self.max_bytes and len(self.cache) > 1:
+            _, old = self.cache.popitem(last=False)
+            self.nbytes -= sum(a.nbytes for a in old)
+        return chunk
+
+    def _delta_file(self, cx: int, cy: int, directory: str | None = None) -> str:
+        return os.path.join(directory or self.delta_dir, f"chunk_{cx}_{cy}.npz")
+
+    @staticmethod
+    def _read_delta(filename: str) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+        if not os.path.exists(filename):
+            return None
+        with np.load(filename) as f:
+            return f["tiles"], f["units"], f["health"]
+
+    @staticmethod
+    def _write_delta(filename: str, delta: tuple[np.ndarray, np.ndarray, np.ndarray] | None) -> None:
+        if delta is None:
+            if os.path.exists(filename):
+                os.remove(filename)
+            return
+        tiles, units, health = delta
+        np.savez(filename, tiles=tiles, units=units, health=health)
+
+    def load_delta(self, cx: int, cy: int) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+        """(tile indices, units, health) the player changed in the chunk, or None"""
+        if self.delta_dir:
+            return self._read_delta(self._delta_file(cx, cy))
+        key = (cx, cy)
+        if key in self.deltas:
+            self.deltas.move_to_end(key)
+            return self.deltas[key]
+        if self.spill_dir:
+            return self._read_delta(self._delta_file(cx, cy, self.spill_dir))
+        return None
+
+    def save_delta(self, cx: int, cy: int, delta: tuple[np.ndarray, np.ndarray, np.ndarray] | None) -> None:
+        if self.delta_dir:
+            self._write_delta(self._delta_file(cx, cy), delta)
+            return
+        key = (cx, cy)
+        old = self.deltas.pop(key, None)
+        if old is not None:
+            self.delta_bytes -= _delta_size(old)
+        if self.spill_dir:
+            self._write_delta(self._delta_file(cx, cy, self.spill_dir), None)  # the newer one is in memory
+        if delta is None:
+            return
+        self.deltas[key] = delta
+        self.delta_bytes += _delta_size(delta)
+        # spill the least recently used deltas, but always keep the newest one
+        while self.delta_bytes > self.max_delta_bytes and len(self.deltas) > 1:
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix="wildwest_deltas_")
+            (ox, oy), spilled = self.deltas.popitem(last=False)
+            self.delta_bytes -= _delta_size(spilled)
+            self._write_delta(self._delta_file(ox, oy, self.spill_dir), spilled)
+
+    def chunk(self, cx: int, cy: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ground, units and health of the chunk as the player left it"""
+        ground, units, health = self.generated(cx, cy)
+        units, health = units.copy(), health.copy()
+        delta = self.load_delta(cx, cy)
+        if delta is not None:
+            tiles, changed_units, changed_health = delta
+            units.reshape(-1)[tiles] = changed_units
+            health.reshape(-1)[tiles] = changed_health
+        return ground, units, health
+
+    def store_chunk(self, cx: int, cy: int, units: np.ndarray, health: np.ndarray) -> None:
+        """keeps the difference between the chunk as it is now and as generated"""
+        _, generated_units, generated_health = self.generated(cx, cy)
+        changed = (units != generated_units) | (health != generated_health)
+        tiles = np.flatnonzero(changed).astype(np.int32)
+        if len(tiles):
+            self.save_delta(cx, cy, (tiles, units.reshape(-1)[tiles], health.reshape(-1)[tiles]))
+        else:
+            self.save_delta(cx, cy, None)
+
+    #
+    # the window loaded into the WildWest
+    #
+    def world_position(self, x: int, y: int) -> tuple[int, int]:
+        return x + self.origin[0] * self.chunk_size, y + self.origin[1] * self.chunk_size
+
+    def _chunks_in_window(self):
+        """chunk coordinates and the tile offset of every chunk in the window"""
+        for j in range(self.view_chunks):
+            for i in range(self.view_chunks):
+                yield self.origin[0] + i, self.origin[1] + j, i * self.chunk_size, j * self.chunk_size
+
+    def start(self, wildwest, x: int = CHUNK_SIZE // 2, y: int = CHUNK_SIZE // 2) -> None:
+        """loads the window around world tile (x, y) and puts the player there"""
+        size = self.chunk_size
+        self.origin = (x // size - self.view_chunks // 2, y // size - self.view_chunks // 2)
+        self._load(wildwest, x - self.origin[0] * size, y - self.origin[1] * size)
+
+    def follow(self, wildwest) -> bool:
+        """
+        moves the window when the player left its middle chunk,
+        call after the player moved, returns True if the window moved
+        """
+        size = self.chunk_size
+        pos = wildwest.player.position
+        middle = self.view_chunks // 2
+        dx, dy = pos.x // size - middle, pos.y // size - middle
+        if dx == 0 and dy == 0:
+            return False
+        self.store(wildwest)
+        self.origin = (self.origin[0] + dx, self.origin[1] + dy)
+        self._load(wildwest, pos.x - dx * size, pos.y - dy * size)
+        return True
+
+    def store(self, wildwest) -> None:
+        """
+        stores the coins, riders and enemies of the window back into the chunks,
+        bullets in flight are dropped
+        """
+        side = self.view_chunks * self.chunk_size
+        units = np.full((side, side), EMPTY, np.uint8)
+        health = np.zeros((side, side), np.int16)
+        for tile in UNITS:
+            store = wildwest.store[TILES[tile]]
+            slots = store.slots()
+            units[store.y[slots], store.x[slots]] = ord(tile)
+            health[store.y[slots], store.x[slots]] = store.health[slots]
+        size = self.chunk_size
+        for cx, cy, x0, y0 in self._chunks_in_window():
+            self.store_chunk(cx, cy, units[y0:y0 + size, x0:x0 + size], health[y0:y0 + size, x0:x0 + size])
+
+    def _load(self, wildwest, player_x: int, player_y: int) -> None:
+        size = self.chunk_size
+        side = self.view_chunks * size
+        ground = np.empty((side, side), np.uint8)
+        units = np.empty((side, side), np.uint8)
+        health = np.empty((side, side), np.int16)
+        for cx, cy, x0, y0 in self._chunks_in_window():
+            chunk = self.chunk(cx, cy)
+            for window, part in zip((ground, units, health), chunk):
+                window[y0:y0 + size, x0:x0 + size] = part
+
+        wildwest.reset(xsize=side, ysize=side)
+        wildwest.player.position.x = player_x
+        wildwest.player.position.y = player_y
+        for layer, tiles in ((ground, GROUND), (units, UNITS)):
+            for tile in tiles:
+                y, x = np.nonzero(layer == ord(tile))
+                wildwest.spawn_many(TILES[tile], x.astype(np.int32), y.astype(np.int32), health=health[y, x])
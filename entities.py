@@ -0,0 +1,270 @@
+"""
+Struct-of-arrays entity store for the Wild West game logic
+
+Every kind of entity (walls, coins, enemies, bullets, ...) lives in one
+EntityStore: parallel typed NumPy arrays indexed by a slot number.
+Dead slots are recycled, so spawning and killing never allocate
+a Python object per entity.
+
+EntityList and EntityView wrap a store so the rest of the code can keep
+using `for e in wildwest.enemies: e.position.x` style attribute access.
+"""
+import numpy as np
+
+#
+# directions are stored as small integer codes
+#
+DIRECTIONS = ["up", "down", "left", "right"]
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+# x and y step for every direction code
+DX = np.array([0, 0, -1, 1], np.int32)
+DY = np.array([-1, 1, 0, 0], np.int32)
+STEPS = list(zip(DX.tolist(), DY.tolist()))
+
+
+def fields_of(entity) -> tuple[int, int, int, int, int]:
+    """(x, y, health, direction, shoot_counter) of a model or a view"""
+    position = getattr(entity, "position", entity)
+    direction = getattr(entity, "last_direction", getattr(entity, "direction", "up"))
+    return (
+        position.x,
+        position.y,
+        getattr(entity, "health", 0),
+        DIRECTION_CODES[direction],
+        getattr(entity, "shoot_counter", 0),
+    )
+
+
+FIELDS = ("x", "y", "health", "direction", "shoot_counter", "alive", "born")
+# kept per slot as well, but not part of the entity's state (see game_logic.get_changes)
+TRACKING = ("changed",)
+
+
+class EntityStore:
+    """all entities of one kind as parallel arrays"""
+
+    def __init__(self, capacity: int = 16, limit: int | None = None):
+        self.x = np.zeros(capacity, np.int32)
+        self.y = np.zeros(capacity, np.int32)
+        self.health = np.zeros(capacity, np.int16)
+        self.direction = np.zeros(capacity, np.int8)
+        self.shoot_counter = np.zeros(capacity, np.int8)
+        self.alive = np.zeros(capacity, np.bool_)
+        self.born = np.zeros(capacity, np.int64)  # spawn number, the oldest entity has the lowest
+        self.changed = np.zeros(capacity, np.int64)  # world version of the last spawn, move or kill
+        self.spawned = 0
+        # at most this many entities at once (None: no limit), WildWest.make_room() keeps to it
+        self.limit = limit
+        self.dropped = 0  # entities killed to make room for new ones
+        self.refused = 0  # entities not spawned for lack of room
+        # stack of free slots, the lowest slot is on top
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self.free_count = capacity
+        if limit is not None:
+            self.reserve(limit)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.alive)
+
+    @property
+    def count(self) -> int:
+        return self.capacity - self.free_count
+
+    def _grow(self) -> None:
+        """doubles the capacity of every array"""
+        old = self.capacity
+        for name in FIELDS + TRACKING:
+            array = getattr(self, name)
+            grown = np.zeros(old * 2, array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        free = np.zeros(old * 2, np.int32)
+        free[:old] = np.arange(old * 2 - 1, old - 1, -1)
+        free[old:old + self.free_count] = self.free[:self.free_count]
+        self.free = free
+        self.free_count += old
+
+    def reserve(self, capacity: int) -> None:
+        """grows the arrays to `capacity` slots now, so spawning up to that never allocates"""
+        while self.capacity < capacity:
+            self._grow()
+
+    def oldest(self, n: int) -> np.ndarray:
+        """slots of the n living entities spawned first"""
+        slots = self.slots()
+        if n >= len(slots):
+            return slots
+        return slots[np.argpartition(self.born[slots], n)[:n]]
+
+    def spawn(self, x: int, y: int, health: int = 0, direction: int = 0, shoot_counter: int = 0) -> int:
+        """puts a new entity into a free slot and returns the slot"""
+        if self.free_count == 0:
+            self._grow()
+        self.free_count -= 1
+        slot = int(self.free[self.free_count])
+        self.x[slot] = x
+        self.y[slot] = y
+        self.health[slot] = health
+        self.direction[slot] = direction
+        self.shoot_counter[slot] = shoot_counter
+        self.alive[slot] = True
+        self.born[slot] = self.spawned
+        self.spawned += 1
+        return slot
+
+    def kill(self, slot: int) -> None:
+        if self.alive[slot]:
+            self.alive[slot] = False
+            self.free[self.free_count] = slot
+            self.free_count += 1
+
+    def spawn_many(self, x: np.ndarray, y: np.ndarray, health=0, direction=0, shoot_counter=0) -> np.ndarray:
+        """spawn() for a whole array of entities, returns their slots"""
+        n = len(x)
+        while self.free_count < n:
+            self._grow()
+        slots = self.free[self.free_count - n:self.free_count][::-1].copy()
+        self.free_count -= n
+        self.x[slots] = x
+        self.y[slots] = y
+        self.health[slots] = health
+        self.direction[slots] = direction
+        self.shoot_counter[slots] = shoot_counter
+        self.alive[slots] = True
+        self.born[slots] = np.arange(self.spawned, self.spawned + n)
+        self.spawned += n
+        return slots
+
+    def kill_many(self, slots: np.ndarray) -> None:
+        slots = np.unique(slots[self.alive[slots]])
+        self.alive[slots] = False
+        self.free[self.free_count:self.free_count + len(slots)] = slots
+        self.free_count += len(slots)
+
+    def clear(self) -> None:
+        self.alive[:] = False
+        self.free[:] = np.arange(self.capacity - 1, -1, -1)
+        self.free_count = self.capacity
+
+    def slots(self) -> np.ndarray:
+        """slot numbers of all living entities in ascending order"""
+        return np.flatnonzero(self.alive)
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in FIELDS) + self.free.nbytes
+
+
+class EntityView:
+    """
+    attribute access to one slot of a store
+
+    `position` returns the view itself, so both `view.x` and
+    `view.position.x` work for walls, enemies and bullets alike.
+    Assignments go through the world, so the occupancy grid and
+    the change feed see them.
+    """
+
+    __slots__ = ("world", "kind", "slot")
+
+    def __init__(self, world, kind: str, slot: int):
+        self.world = world
+        self.kind = kind
+        self.slot = slot
+
+    @property
+    def store(self) -> EntityStore:
+        return self.world.store[self.kind]
+
+    def _set(self, name: str, value: int) -> None:
+        getattr(self.store, name)[self.slot] = value
+        self.world.touch(self.kind, self.slot)
+
+    @property
+    def x(self) -> int:
+        return int(self.store.x[self.slot])
+
+    @x.setter
+    def x(self, value: int) -> None:
+        self.world.move(self.kind, self.slot, value, self.y)
+
+    @property
+    def y(self) -> int:
+        return int(self.store.y[self.slot])
+
+    @y.setter
+    def y(self, value: int) -> None:
+        self.world.move(self.kind, self.slot, self.x, value)
+
+    @property
+    def position(self) -> "EntityView":
+        return self
+
+    @position.setter
+    def position(self, value) -> None:
+        self.world.move(self.kind, self.slot, value.x, value.y)
+
+    @property
+    def health(self) -> int:
+        return int(self.store.health[self.slot])
+
+    @health.setter
+    def health(self, value: int) -> None:
+        self._set("health", value)
+
+    @property
+    def shoot_counter(self) -> int:
+        return int(self.store.shoot_counter[self.slot])
+
+    @shoot_counter.setter
+    def shoot_counter(self, value: int) -> None:
+        self._set("shoot_counter", value)
+
+    @property
+    def direction(self) -> str:
+        return DIRECTIONS[self.store.direction[self.slot]]
+
+    @direction.setter
+    def direction(self, value: str) -> None:
+        self._set("direction", DIRECTION_CODES[value])
+
+    # enemies call the direction they shoot in their last direction
+    last_direction = direction
+
+    def __repr__(self) -> str:
+        return f"EntityView(slot={self.slot}, x={self.x}, y={self.y})"
+
+
+class EntityList:
+    """
+    list-like view over the living entities of one kind
+
+    Spawning and removing goes through the world, so that
+    the occupancy grid stays in sync with the store.
+    """
+
+    __slots__ = ("world", "kind")
+
+    def __init__(self, world, kind: str):
+        self.world = world
+        self.kind = kind
+
+    @property
+    def store(self) -> EntityStore:
+        return self.world.store[self.kind]
+
+    def __len__(self) -> int:
+        return self.store.count
+
+    def __iter__(self):
+        return (EntityView(self.world, self.kind, slot) for slot in self.store.slots().tolist())
+
+    def __getitem__(self, index: int) -> EntityView:
+        return EntityView(self.world, self.kind, int(self.store.slots()[index]))
+
+    def append(self, entity) -> None:
+        """adds a Position, Enemy or Bullet model (or another view)"""
+        self.world.spawn(self.kind, *fields_of(entity))
+
+    def remove(self, view: EntityView) -> None:
+        self.world.kill(self.kind, view.slot)
@@ -0,0 +1,101 @@
+"""
+Flow field for riders and enemies
+
+One breadth-first search from the player gives the number of steps from
+every tile around the player to the player. Every walker then steps to
+the neighbor closest to the player, so the cost of pathfinding does not
+depend on how many walkers there are.
+"""
+import numpy as np
+
+from entities import STEPS
+from occupancy import OccupancyGrid, BLOCKS_WALKERS, RIDER_ENEMY, ENEMY
+
+# walkers find their way around these, other walkers only block them for a moment
+BLOCKS_PATHS = BLOCKS_WALKERS ^ (RIDER_ENEMY | ENEMY)
+# distance of tiles the flow field does not reach
+FAR = np.iinfo(np.int16).max
+# the direction code of walkers next to the player: pursuit ends there, they don't step onto the player
+STAY = 4
+
+
+class FlowField:
+    """
+    number of steps from every tile around the player to the player,
+    found by one breadth-first search shared by all riders and enemies
+
+    Only the tiles up to `radius` tiles from the player are searched,
+    so the cost does not depend on the size of the map or on how many
+    walkers use it.
+    """
+
+    def __init__(self, grid: OccupancyGrid, x: int, y: int, radius: int):
+        self.rows, self.cols = grid.window(x - radius, y - radius, x + radius + 1, y + radius + 1)
+        self.x0, self.y0 = self.cols.start, self.rows.start
+        h = self.rows.stop - self.rows.start
+        w = self.cols.stop - self.cols.start
+        # one blocked tile of padding around the window, so neighbors never leave it
+        width = w + 2
+        open_tiles = np.zeros((h + 2, width), bool)
+        open_tiles[1:-1, 1:-1] = (grid.flags[self.rows, self.cols] & BLOCKS_PATHS) == 0
+        open_tiles = open_tiles.reshape(-1)
+        dist = np.full(open_tiles.size, FAR, np.int16)
+        offsets = np.array([-width, width, -1, 1])  # the direction codes up, down, left, right
+        frontier = np.array([(y - self.y0 + 1) * width + x - self.x0 + 1])
+        dist[frontier] = 0
+        steps = 0
+        while frontier.size:
+            steps += 1
+            tiles = (frontier[:, np.newaxis] + offsets).reshape(-1)
+            tiles = np.unique(tiles[open_tiles[tiles] & (dist[tiles] == FAR)])
+            dist[tiles] = steps
+            frontier = tiles
+        self.dist = dist.reshape(h + 2, width)
+
+    def next_directions(self, x: np.ndarray, y: np.ndarray, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+        """
+        direction code of a step towards the player for every walker at (x, y)
+        (STAY next to the player), and a mask of the walkers the field reaches
+        (the others get no direction); when several steps are equally good
+        one of them is picked at random
+        """
+        lx = x - self.x0 + 1
+        ly = y - self.y0 + 1
+        h, w = self.dist.shape
+        inside = (lx >= 1) & (lx < w - 1) & (ly >= 1) & (ly < h - 1)
+        lx, ly = np.where(inside, lx, 1), np.where(inside, ly, 1)
+        here = self.dist[ly, lx]
+        around = np.stack([self.dist[ly + dy, lx + dx] for dx, dy in STEPS], axis=1)
+        best = np.argmin(around + rng.random(around.shape), axis=1)
+        step = around[np.arange(len(best)), best]
+        reached = inside & (here != FAR) & (step < here)
+        return np.where(step == 0, STAY, best), reached
+
+    def next_direction(self, x: int, y: int, noise: list[float]) -> int | None:
+        """
+        next_directions() for one walker, with its four random numbers for the ties,
+        None if the field doesn't reach it
+        """
+        lx = x - self.x0 + 1
+        ly = y - self.y0 + 1
+        h, w = self.dist.shape
+        if not (1 <= lx < w - 1 and 1 <= ly < h - 1):
+            return None
+        here = int(self.dist[ly, lx])
+        around = [int(self.dist[ly + dy, lx + dx]) for dx, dy in STEPS]
+        best = min(range(len(around)), key=lambda i: around[i] + noise[i])
+        if here == FAR or around[best] >= here:
+            return None
+        return STAY if around[best] == 0 else best
+
+
+def player_flow_field(wildwest) -> FlowField | None:
+    """the flow field to the player, searched again only after the player or a coin moved"""
+    if wildwest.pursuit_radius is None:
+        return None
+    p = wildwest.player.position
+    key = (wildwest.grid, p.x, p.y, wildwest.store["coins"].count, wildwest.pursuit_radius)
+    if wildwest.flow_key != key:
+        wildwest.flow = FlowField(wildwest.grid, p.x, p.y, wildwest.pursuit_radius)
+        wildwest.flow_key = key
+    return wildwest.flow
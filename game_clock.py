@@ -0,0 +1,76 @@
+"""
+Clocks for the game loop
+
+The simulation advances in ticks of a fixed length of wall-clock time,
+independent of how fast frames are drawn (FixedTimestep). Frames are
+capped at a maximum rate (FrameLimiter). Between ticks or frames the
+loops wait, for actions or for keys, until the next one is due instead
+of spinning.
+"""
+import time
+
+
+class FixedTimestep:
+    """
+    tells the simulation loop how many ticks are due
+    and how long it may wait before the next one
+    """
+
+    def __init__(self, tick_rate: float, max_steps_per_frame: int = 5, now=time.perf_counter):
+        self.tick_interval = 1.0 / tick_rate
+        self.max_steps_per_frame = max_steps_per_frame
+        self.now = now
+        self.dropped_ticks = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """starts counting from now, e.g. after a cutscene paused the game"""
+        self.next_tick = self.now() + self.tick_interval
+
+    def steps(self) -> int:
+        """
+        number of simulation ticks due since the last call,
+        when the loop fell far behind the extra ticks are dropped
+        so it does not spiral trying to catch up
+        """
+        t = self.now()
+        if t < self.next_tick:
+            return 0
+        due = int((t - self.next_tick) / self.tick_interval) + 1
+        self.next_tick += due * self.tick_interval
+        if due > self.max_steps_per_frame:
+            self.dropped_ticks += due - self.max_steps_per_frame
+            due = self.max_steps_per_frame
+        return due
+
+    def wait_ms(self) -> int:
+        """milliseconds until the next tick is due, at least 1"""
+        return max(1, round((self.next_tick - self.now()) * 1000))
+
+
+class FrameLimiter:
+    """tells the window loop when it may draw the next frame, at most max_fps times a second"""
+
+    def __init__(self, max_fps: float, now=time.perf_counter):
+        self.frame_interval = 1.0 / max_fps
+        self.now = now
+        self.next_frame = now()
+
+    def frame_due(self) -> bool:
+        """True (and starts the next frame interval) if a frame may be drawn now"""
+        t = self.now()
+        if t < self.next_frame:
+            return False
+        self.next_frame = t + self.frame_interval
+        return True
+
+    def wait_ms(self) -> int:
+        """
+        milliseconds until the next frame may be drawn, a whole frame interval
+        when that time has passed without a frame (nothing new to draw),
+        so an idle loop wakes at most max_fps times a second
+        """
+        wait = round((self.next_frame - self.now()) * 1000)
+        if wait <= 0:
+            return max(1, round(self.frame_interval * 1000))
+        return wait
@@ -2,123 +2,445 @@
 Wild West game logic
 """
 
-from pydantic import BaseModel
-from levels import LEVELS
-import random
+from collections import deque
+from typing import NamedTuple
+
+from levels import LEVELS, PROJECTILE_CAPS
+from level_files import CompiledLevel, compile_level
+from entities import EntityStore, EntityList, DIRECTION_CODES, DX, DY, STEPS, fields_of
+from profiling import profiler
+from line_of_sight import LineOfSight
+from flow_field import player_flow_field
+from occupancy import (
+    OccupancyGrid, WALL, COIN, CAVE_ENTRANCE, TRAP, RIDER_ENEMY, ENEMY, BULLET, ENEMY_BULLET,
+    BLOCKS_WALKERS, BLOCKS_BULLETS,
+)
+import numpy as np
 
 #
 # define data model
 #
-class Position(BaseModel):
-    x: int
-    y: int
-
-
-class Player(BaseModel):
-    position: Position
-    health: int = 10
-    coins: int = 0
-    last_direction: str = "up"
-
-class Bullet(BaseModel):
-    position: Position
-    direction: str
-
-class EnemyBullet(BaseModel): #separate class for enemy bullets
-    position: Position
-    direction: str
-
-class Enemy (BaseModel):
-    health: int = 5
-    position: Position
-    direction: str = "up"
-    shoot_counter: int = 0
-    last_direction: str = "up"  # Track the last direction moved
-
-class WildWest(BaseModel):
-    player: Player
-    walls: list[Position] = []
-    coins: list[Position] = []
-    cave_entrances: list[Position] = []
-    traps: list[Position] = []
-    bullets: list[Bullet] = []
-    enemy_bullets: list[EnemyBullet] = []
-    rider_enemies: list[Position] = []
-    enemies: list[Enemy] = []
-
-    event: str = ""
-    level_number: int = 0
-
-
-
-
-def get_next_position(position: Position, direction: str, occupied: list[Position]) -> Position:
-    new = Position(x=position.x, y=position.y)
-    if direction == "right" and new.x < 9:
-        new.x += 1
-    elif direction == "left" and new.x > 0:
-        new.x -= 1
-    elif direction == "up" and new.y > 0:
-        new.y -= 1
-    elif direction == "down":
-        if new.y < 9:
-            new.y += 1
-    if new in occupied:
+# While playing, all entities live in the EntityStores of WildWest,
+# only the player and positions are objects. The pydantic models
+# that describe a game for loading and saving are in save_format.
+#
+ENEMY_HEALTH = 5
+PLAYER_HEALTH = 10
+
+# what WildWest.emit() reports, the last three end or change the level
+EVENTS = ("coin", "hit", "shot", "new level", "game over", "you died")
+GAME_FLOW_EVENTS = ("new level", "game over", "you died")
+# events a world keeps until they are drained, whoever runs the world drains them every tick
+EVENT_BACKLOG = 1024
+
+# bullets in flight at once on levels without caps of their own (see levels.PROJECTILE_CAPS),
+# their stores are allocated this big when the level starts and never grow while playing
+DEFAULT_PROJECTILE_CAPS = {"bullets": 256, "enemy_bullets": 4096}
+# what happens to a new bullet when its kind is at the cap
+DROP_OLDEST = "drop oldest"  # the oldest bullet in flight disappears
+REFUSE = "refuse"  # the new bullet is not fired
+
+# update() moves fewer walkers or bullets than this one slot at a time,
+# below it the fixed cost of the array operations is more than the work
+SCALAR_LIMIT = 32
+
+
+class Position:
+    """a tile of the map"""
+
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: int, y: int):
+        self.x = x
+        self.y = y
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Position) and self.x == other.x and self.y == other.y
+
+    def __repr__(self) -> str:
+        return f"Position(x={self.x}, y={self.y})"
+
+    def model_copy(self, deep: bool = False) -> "Position":
+        return Position(x=self.x, y=self.y)
+
+
+class Player:
+    """the player, with the same fields and copying as save_format.Player"""
+
+    __slots__ = ("position", "health", "coins", "last_direction")
+
+    def __init__(self, position: Position, health: int = PLAYER_HEALTH, coins: int = 0, last_direction: str = "up"):
+        self.position = position
+        self.health = health
+        self.coins = coins
+        self.last_direction = last_direction
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Player) and all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Player(position={self.position}, health={self.health}, coins={self.coins})"
+
+    def model_copy(self, deep: bool = False) -> "Player":
+        position = self.position.model_copy() if deep else self.position
+        return Player(position, self.health, self.coins, self.last_direction)
+
+
+# the pydantic models of save_format, also importable from here
+SAVE_MODELS = ("Bullet", "EnemyBullet", "Enemy", "WildWestState")
+
+
+def __getattr__(name: str):
+    if name in SAVE_MODELS:
+        import save_format
+        return getattr(save_format, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# every kind of entity with the flag it sets in the occupancy grid
+KINDS = {
+    "walls": WALL,
+    "coins": COIN,
+    "cave_entrances": CAVE_ENTRANCE,
+    "traps": TRAP,
+    "rider_enemies": RIDER_ENEMY,
+    "bullets": BULLET,
+    "enemy_bullets": ENEMY_BULLET,
+    "enemies": ENEMY,
+}
+
+
+def projectile_caps(level_number: int) -> dict[str, int]:
+    """the bullet caps of a level, DEFAULT_PROJECTILE_CAPS past the levels that have their own"""
+    if 0 <= level_number < len(PROJECTILE_CAPS):
+        return PROJECTILE_CAPS[level_number]
+    return DEFAULT_PROJECTILE_CAPS
+
+
+def _kind_property(kind: str) -> property:
+    """
+    wildwest.<kind> as a list-like view on its store,
+    assigning a list of models replaces all entities of that kind
+    """
+    def getter(wildwest) -> EntityList:
+        return EntityList(wildwest, kind)
+
+    def setter(wildwest, entities) -> None:
+        fields = [fields_of(e) for e in entities]
+        for slot in wildwest.store[kind].slots().tolist():
+            wildwest.kill(kind, slot)
+        for f in fields:
+            wildwest.spawn(kind, *f)
+
+    return property(getter, setter)
+
+
+class WildWest:
+    """
+    a running game
+
+    Entities of each kind are kept in an EntityStore,
+    `wildwest.enemies` etc. are list-like views on them.
+    """
+
+    walls = _kind_property("walls")
+    coins = _kind_property("coins")
+    cave_entrances = _kind_property("cave_entrances")
+    traps = _kind_property("traps")
+    bullets = _kind_property("bullets")
+    enemy_bullets = _kind_property("enemy_bullets")
+    rider_enemies = _kind_property("rider_enemies")
+    enemies = _kind_property("enemies")
+
+    def __init__(self, player: Player, event: str = "", level_number: int = 0, seed: int | None = None):
+        self.player = player
+        self.players = [player]  # everyone playing, riders and enemies pursue players[0], `player`
+        self.event = event  # the last game flow event, kept for saving
+        self.events = deque(maxlen=EVENT_BACKLOG)  # everything emitted and not drained yet
+        self.level_number = level_number
+        self.store = {kind: EntityStore() for kind in KINDS}
+        self.grid = OccupancyGrid(xsize=10, ysize=10)  # replaced by start_level
+        # goes up whenever an entity or the player changes, see get_changes()
+        self.version = 0
+        self.player_version = 0  # version of the last change of the player
+        self.reset_version = 0  # version when everything was replaced last
+        self.tick = 0
+        self.overflow = {"bullets": REFUSE, "enemy_bullets": DROP_OLDEST}
+        # riders and enemies further than active_radius tiles from the player
+        # only act every far_update_interval ticks (None: all act every tick)
+        self.active_radius = None
+        self.far_update_interval = 4
+        # riders and enemies up to this many tiles from the player head for the player (None: they all wander)
+        self.pursuit_radius = 12
+        self.flow = None  # FlowField of the last tick
+        self.flow_key = None
+        # shots hit the first thing in their line at once instead of flying as bullets
+        self.hit_scan = False
+        self.sight = None  # LineOfSight of the level, made when it is first needed
+        # random numbers for enemy and rider movement, the same seed
+        # and the same player actions always play the same game
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def emit(self, event: str) -> None:
+        """reports one of EVENTS, several events in one tick never overwrite each other"""
+        self.events.append(event)
+        if event in GAME_FLOW_EVENTS:
+            self.event = event
+
+    def drain_events(self) -> list[str]:
+        """the events emitted since the last drain, oldest first"""
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+    def touch(self, kind: str, slots) -> None:
+        """records that the entities in `slots` spawned, moved or died, for get_changes()"""
+        if np.ndim(slots) == 0 or len(slots):
+            self.version += 1
+            self.store[kind].changed[slots] = self.version
+
+    def touch_player(self) -> None:
+        self.version += 1
+        self.player_version = self.version
+
+    def invalidate(self) -> None:
+        """everything was replaced, get_changes() from an older version lists all entities again"""
+        for store in self.store.values():
+            if len(store.changed) != store.capacity:
+                store.changed = np.zeros(store.capacity, np.int64)
+        self.version += 1
+        self.reset_version = self.player_version = self.version
+
+    def make_room(self, kind: str, n: int) -> int:
+        """
+        how many of n new entities of a kind fit under the limit of its store,
+        with the DROP_OLDEST policy the oldest ones are killed to make room
+        """
+        store = self.store[kind]
+        if store.limit is None or store.count + n <= store.limit:
+            return n
+        free = store.limit - store.count
+        if self.overflow.get(kind, REFUSE) == DROP_OLDEST:
+            if n > store.limit:
+                store.refused += n - store.limit
+                n = store.limit
+            drop = store.oldest(n - free)
+            self.kill_many(kind, drop)
+            store.dropped += len(drop)
+            return n
+        store.refused += n - free
+        return free
+
+    def spawn(self, kind: str, x: int, y: int, health: int = 0, direction: int = 0, shoot_counter: int = 0) -> int:
+        """the slot of the new entity, -1 if there is no room for it"""
+        if not self.make_room(kind, 1):
+            return -1
+        slot = self.store[kind].spawn(x, y, health, direction, shoot_counter)
+        self.grid.add(x, y, KINDS[kind], slot)
+        self.touch(kind, slot)
+        return slot
+
+    def kill(self, kind: str, slot: int) -> None:
+        store = self.store[kind]
+        if store.alive[slot]:
+            self.grid.remove(int(store.x[slot]), int(store.y[slot]), KINDS[kind])
+            store.kill(slot)
+            self.touch(kind, slot)
+
+    def spawn_many(self, kind: str, x: np.ndarray, y: np.ndarray, **fields) -> np.ndarray:
+        """the slots of the new entities, the ones without room (the last ones) are left out"""
+        n = self.make_room(kind, len(x))
+        if n < len(x):
+            x, y = x[:n], y[:n]
+            fields = {name: value[:n] if np.ndim(value) else value for name, value in fields.items()}
+        slots = self.store[kind].spawn_many(x, y, **fields)
+        self.grid.add_many(x, y, KINDS[kind], slots)
+        self.touch(kind, slots)
+        return slots
+
+    def kill_many(self, kind: str, slots: np.ndarray) -> None:
+        store = self.store[kind]
+        slots = np.unique(slots[store.alive[slots]])
+        self.grid.remove_many(store.x[slots], store.y[slots], KINDS[kind])
+        store.kill_many(slots)
+        self.touch(kind, slots)
+
+    def move(self, kind: str, slot: int, x: int, y: int) -> None:
+        store = self.store[kind]
+        self.grid.move(int(store.x[slot]), int(store.y[slot]), x, y, KINDS[kind])
+        store.x[slot] = x
+        store.y[slot] = y
+        self.touch(kind, slot)
+
+    def set_projectile_caps(self, caps: dict[str, int]) -> None:
+        """limits the bullets in flight, their stores get all the slots they may need now"""
+        for kind, limit in caps.items():
+            store = self.store[kind]
+            store.limit = limit
+            store.reserve(limit)
+
+    def reset(self, xsize: int, ysize: int) -> None:
+        """removes all entities and makes an empty grid"""
+        for store in self.store.values():
+            store.clear()
+        self.grid = OccupancyGrid(xsize=xsize, ysize=ysize)
+        self.invalidate()
+
+    def to_model(self):
+        """the game as a save_format.WildWestState"""
+        import save_format as saved
+
+        p = self.player
+        state = saved.WildWestState(
+            player=saved.Player(
+                position=saved.Position(x=p.position.x, y=p.position.y),
+                health=p.health,
+                coins=p.coins,
+                last_direction=p.last_direction,
+            ),
+            event=self.event,
+            level_number=self.level_number,
+            xsize=self.grid.xsize,
+            ysize=self.grid.ysize,
+        )
+        for kind in ("walls", "coins", "cave_entrances", "traps", "rider_enemies"):
+            setattr(state, kind, [saved.Position(x=e.x, y=e.y) for e in getattr(self, kind)])
+        state.bullets = [
+            saved.Bullet(position=saved.Position(x=b.x, y=b.y), direction=b.direction) for b in self.bullets
+        ]
+        state.enemy_bullets = [
+            saved.EnemyBullet(position=saved.Position(x=b.x, y=b.y), direction=b.direction)
+            for b in self.enemy_bullets
+        ]
+        state.enemies = [
+            saved.Enemy(
+                position=saved.Position(x=e.x, y=e.y),
+                health=e.health,
+                shoot_counter=e.shoot_counter,
+                last_direction=e.last_direction,
+            )
+            for e in self.enemies
+        ]
+        return state
+
+    @classmethod
+    def from_model(cls, state) -> "WildWest":
+        """the game saved in a save_format.WildWestState"""
+        p = state.player
+        wildwest = cls(
+            player=Player(Position(x=p.position.x, y=p.position.y), p.health, p.coins, p.last_direction),
+            event=state.event,
+            level_number=state.level_number,
+        )
+        wildwest.reset(state.xsize, state.ysize)
+        wildwest.set_projectile_caps(projectile_caps(state.level_number))
+        for kind in KINDS:
+            setattr(wildwest, kind, getattr(state, kind))
+        return wildwest
+
+
+def save_game(wildwest: WildWest, filename: str) -> None:
+    with open(filename, "w") as f:
+        f.write(wildwest.to_model().model_dump_json())
+
+
+def load_game(filename: str) -> WildWest:
+    from save_format import WildWestState
+
+    with open(filename) as f:
+        return WildWest.from_model(WildWestState.model_validate_json(f.read()))
+
+
+def next_tile(x: int, y: int, direction: int, grid: OccupancyGrid, blocked_by: int) -> tuple[int, int]:
+    """
+    the tile one step from (x, y) in the given direction code,
+    or (x, y) itself if that step leaves the map or is blocked
+    """
+    dx, dy = STEPS[direction]
+    new_x, new_y = x + dx, y + dy
+    if not grid.inside(new_x, new_y) or grid.has(new_x, new_y, blocked_by):
+        return x, y
+    return new_x, new_y
+
+
+def get_next_position(position: Position, direction: str, grid: OccupancyGrid, blocked_by: int) -> Position:
+    """moves one tile in direction unless the grid has a `blocked_by` entity there"""
+    x, y = next_tile(position.x, position.y, DIRECTION_CODES[direction], grid, blocked_by)
+    if (x, y) == (position.x, position.y):
         return position
-    else:
-        return new
+    return Position(x=x, y=y)
 
 
 def move_command(wildwest, player, action: str) -> None:
     """handles player actions like 'left', 'right', 'jump', 'bullet'"""
     # remember old position
     old_position = player.position.model_copy()
+    old_coins = player.coins
     pos = player.position
+    grid = wildwest.grid
 
     if action in ["up", "down", "left", "right"]:
-        new = get_next_position(player.position, action, wildwest.walls)
+        new = get_next_position(player.position, action, grid, WALL)
         player.last_direction = action
         player.position = new
 
     elif action == "jump":
         pos.x += 2
     elif action == "shot":
-        bullet = Bullet(position=pos.copy(), direction=player.last_direction)
-        wildwest.bullets.append(bullet)
-    # check for walls
-    for wall in wildwest.walls:
-        if player.position == wall:
-            player.position = old_position
+        if wildwest.hit_scan:
+            wildwest.emit("shot")
+            _hit_scan(wildwest, pos.x, pos.y, DIRECTION_CODES[player.last_direction])
+        elif wildwest.spawn("bullets", pos.x, pos.y, direction=DIRECTION_CODES[player.last_direction]) >= 0:
+            wildwest.emit("shot")
+    # check for walls and the edge of the map
+    x, y = player.position.x, player.position.y
+    if not grid.inside(x, y) or grid.has(x, y, WALL):
+        player.position = old_position
+        x, y = old_position.x, old_position.y
 
     # collect coin if there is any
-    for coin in wildwest.coins:
-        if player.position == coin:
-            # we found a coin
-            wildwest.coins.remove(coin)  # remove the coin we found from the level
-            player.coins += 10
-            print("you now have", player.coins, "coins")
-            break  # stop the loop because we modified coins
+    if grid.has(x, y, COIN):
+        # we found a coin
+        wildwest.kill("coins", grid.get_id(x, y))
+        player.coins += 10
+        wildwest.emit("coin")
+        print("you now have", player.coins, "coins")
+
+    if player is wildwest.player and (player.position != old_position or player.coins != old_coins):
+        wildwest.touch_player()
 
     # check for cave entrances
-    for cave_entrance in wildwest.cave_entrances:
-        if player.position == cave_entrance:
-            wildwest.level_number += 1
-            if wildwest.level_number == len(LEVELS):
-                wildwest.event = "game over"
-            else:
-                wildwest.event = "new level"
-                start_level(wildwest=wildwest,
-                            level=LEVELS[wildwest.level_number],
-                            start_position=Position(x=4, y=8)
-                            )
-    # check for traps
-    for trap in wildwest.traps:
-        if player.position == trap:
-            wildwest.event = "you died"
-    # check for rider enemies
-    for rider_enemy in wildwest.rider_enemies:
-        if player.position == rider_enemy:
-            wildwest.event = "you died"
+    if grid.has(x, y, CAVE_ENTRANCE):
+        wildwest.level_number += 1
+        if wildwest.level_number == len(LEVELS):
+            wildwest.emit("game over")
+        else:
+            wildwest.emit("new level")
+            start_level(wildwest=wildwest,
+                        level=LEVELS[wildwest.level_number],
+                        projectile_caps=projectile_caps(wildwest.level_number),
+                        start_position=Position(x=4, y=8)
+                        )
+        return
+    # check for traps and rider enemies
+    if grid.has(x, y, TRAP | RIDER_ENEMY):
+        wildwest.emit("you died")
+
+
+# order and names of the objects returned by get_objects
+OBJECT_NAMES = [
+    ("walls", "cactus"),
+    ("coins", "coin"),
+    ("cave_entrances", "cave_entrance"),
+    ("traps", "trap"),
+    ("rider_enemies", "rider enemy"),
+    ("bullets", "bullet"),
+    ("enemy_bullets", "enemy_bullet"),
+    ("enemies", "enemy"),
+]
 
 
 def get_objects(wildwest) -> list[list[int, int, str]]:
@@ -128,114 +450,395 @@ def get_objects(wildwest) -> list[list[int, int, str]]:
     """
     result = []
     result.append([wildwest.player.position.x, wildwest.player.position.y, "player"])
-    for w in wildwest.walls:
-        result.append([w.x, w.y, "cactus"])
-    for c in wildwest.coins:
-        result.append([c.x, c.y, "coin"])
-    for r in wildwest.cave_entrances:
-        result.append([r.x, r.y, "cave_entrance"])
-    for t in wildwest.traps:
-        result.append([t.x, t.y, "trap"])
-    for r in wildwest.rider_enemies:
-        result.append([r.x, r.y, "rider enemy"])
-    for f in wildwest.bullets:
-        result.append([f.position.x, f.position.y, "bullet"])
-    for eb in wildwest.enemy_bullets:
-        result.append([eb.position.x, eb.position.y, "enemy_bullet"])
-    for e in wildwest.enemies:
-        result.append([e.position.x, e.position.y, "enemy"])
+    for kind, name in OBJECT_NAMES:
+        store = wildwest.store[kind]
+        slots = store.slots()
+        result.extend([x, y, name] for x, y in zip(store.x[slots].tolist(), store.y[slots].tolist()))
     return result
 
 
+class Changes(NamedTuple):
+    """what get_changes() found"""
+    version: int  # pass it to the next get_changes() call
+    full: bool  # everything was replaced, `updated` lists every entity and old ones are gone
+    updated: list  # [x, y, object_type, slot] of entities that spawned or moved
+    removed: list  # [object_type, slot] of entities that died
+    player: list | None  # [x, y, health, coins] of the player if that changed
+
+
+def get_changes(wildwest, since_version: int) -> Changes:
+    """
+    what changed since `since_version` (0 for everything) in the style of get_objects(),
+    entities are told apart by object type and slot; nothing is scanned or built when
+    nothing changed
+    """
+    version = wildwest.version
+    if since_version >= version:
+        return Changes(version, False, [], [], None)
+    full = since_version < wildwest.reset_version
+    if full:
+        since_version = -1
+    updated = []
+    removed = []
+    for kind, name in OBJECT_NAMES:
+        store = wildwest.store[kind]
+        slots = np.flatnonzero(store.changed > since_version)
+        if not len(slots):
+            continue
+        alive = store.alive[slots]
+        living = slots[alive]
+        updated.extend(
+            [x, y, name, slot]
+            for x, y, slot in zip(store.x[living].tolist(), store.y[living].tolist(), living.tolist())
+        )
+        if not full:
+            removed.extend([name, slot] for slot in slots[~alive].tolist())
+    player = None
+    if wildwest.player_version > since_version:
+        p = wildwest.player
+        player = [p.position.x, p.position.y, p.health, p.coins]
+    return Changes(version, full, updated, removed, player)
+
+
+def step_many(x: np.ndarray, y: np.ndarray, directions: np.ndarray, grid: OccupancyGrid, blocked_by: int):
+    """
+    next_tile() for whole arrays of entities
+
+    returns the new x and y arrays and a mask of the entities that moved,
+    entities that would leave the map or hit a `blocked_by` tile stay put
+    """
+    new_x = x + DX[directions]
+    new_y = y + DY[directions]
+    inside = (new_x >= 0) & (new_x < grid.xsize) & (new_y >= 0) & (new_y < grid.ysize)
+    new_x = np.where(inside, new_x, x)
+    new_y = np.where(inside, new_y, y)
+    moved = inside & ((grid.flags[new_y, new_x] & blocked_by) == 0)
+    return np.where(moved, new_x, x), np.where(moved, new_y, y), moved
+
+
+def _active_slots(wildwest, kind: str) -> np.ndarray:
+    """
+    slots of the riders or enemies that act this tick: all of them every
+    far_update_interval ticks, otherwise only those near the player,
+    looked up in the grid around the player
+    """
+    store = wildwest.store[kind]
+    radius = wildwest.active_radius
+    if radius is None or wildwest.tick % wildwest.far_update_interval == 0:
+        return store.slots()
+    grid = wildwest.grid
+    p = wildwest.player.position
+    rows, cols = grid.window(p.x - radius, p.y - radius, p.x + radius + 1, p.y + radius + 1)
+    found = (grid.flags[rows, cols] & KINDS[kind]) != 0
+    return np.sort(grid.ids[rows, cols][found])
+
+
+def _move_walkers(wildwest) -> None:
+    """
+    riders and enemies take one step, all at once: towards the player
+    if the flow field reaches them (next to the player they wait),
+    otherwise in a random direction
+    """
+    grid = wildwest.grid
+    riders = wildwest.store["rider_enemies"]
+    enemies = wildwest.store["enemies"]
+    rider_slots = _active_slots(wildwest, "rider_enemies")
+    enemy_slots = _active_slots(wildwest, "enemies")
+    n_riders = len(rider_slots)
+
+    # riders wait half of the time (codes 4-7), enemies always walk
+    rng = wildwest.rng
+    directions = np.concatenate([
+        rng.integers(0, 8, n_riders),
+        rng.integers(0, 4, len(enemy_slots)),
+    ])
+    flow = player_flow_field(wildwest)
+    if len(directions) < SCALAR_LIMIT:
+        _move_walkers_per_slot(wildwest, rider_slots, enemy_slots, directions, flow)
+        return
+    x = np.concatenate([riders.x[rider_slots], enemies.x[enemy_slots]])
+    y = np.concatenate([riders.y[rider_slots], enemies.y[enemy_slots]])
+    if flow is not None:
+        towards_player, reached = flow.next_directions(x, y, rng)
+        directions = np.where(reached, (directions & 4) | towards_player, directions)
+    new_x, new_y, moved = step_many(x, y, directions & 3, grid, BLOCKS_WALKERS)
+    moved &= directions < 4
+
+    # when several walkers head for the same tile, the first one gets it
+    movers = np.flatnonzero(moved)
+    _, first = np.unique(new_y[movers] * grid.xsize + new_x[movers], return_index=True)
+    moved[:] = False
+    moved[movers[first]] = True
+    new_x = np.where(moved, new_x, x)
+    new_y = np.where(moved, new_y, y)
+
+    # take all movers off the grid before putting them on their new tiles
+    parts = (
+        (riders, RIDER_ENEMY, rider_slots, slice(0, n_riders)),
+        (enemies, ENEMY, enemy_slots, slice(n_riders, None)),
+    )
+    for store, flag, slots, part in parts:
+        m = moved[part]
+        grid.remove_many(x[part][m], y[part][m], flag)
+    for store, flag, slots, part in parts:
+        m = moved[part]
+        grid.add_many(new_x[part][m], new_y[part][m], flag, slots[m])
+        store.x[slots] = new_x[part]
+        store.y[slots] = new_y[part]
+    wildwest.touch("rider_enemies", rider_slots[moved[:n_riders]])
+    wildwest.touch("enemies", enemy_slots[moved[n_riders:]])
+    # Update last_direction on actual movement
+    m = moved[n_riders:]
+    enemies.direction[enemy_slots[m]] = directions[n_riders:][m]
+
+
+def _move_walkers_per_slot(wildwest, rider_slots, enemy_slots, directions, flow) -> None:
+    """
+    the same steps as _move_walkers() for a few walkers, one at a time:
+    every step is checked against the grid before anyone moved
+    """
+    grid = wildwest.grid
+    walkers = [("rider_enemies", slot) for slot in rider_slots.tolist()]
+    walkers += [("enemies", slot) for slot in enemy_slots.tolist()]
+    if flow is not None:
+        noise = wildwest.rng.random((len(walkers), 4)).tolist()
+    steps = []
+    taken = set()
+    for i, (kind, slot) in enumerate(walkers):
+        store = wildwest.store[kind]
+        x, y = int(store.x[slot]), int(store.y[slot])
+        direction = int(directions[i])
+        if flow is not None:
+            towards_player = flow.next_direction(x, y, noise[i])
+            if towards_player is not None:
+                direction = (direction & 4) | towards_player
+        if direction >= 4:
+            continue
+        tile = next_tile(x, y, direction, grid, BLOCKS_WALKERS)
+        if tile != (x, y) and tile not in taken:
+            taken.add(tile)
+            steps.append((kind, slot, x, y, tile, direction))
+
+    moved = {"rider_enemies": [], "enemies": []}
+    for kind, slot, x, y, (new_x, new_y), direction in steps:
+        store = wildwest.store[kind]
+        grid.move(x, y, new_x, new_y, KINDS[kind])
+        store.x[slot] = new_x
+        store.y[slot] = new_y
+        if kind == "enemies":
+            store.direction[slot] = direction
+        moved[kind].append(slot)
+    for kind, slots in moved.items():
+        wildwest.touch(kind, slots)
+
+
+def line_of_sight(wildwest) -> LineOfSight:
+    """the line-of-sight index of the level, made again when a new level started"""
+    if wildwest.sight is None or wildwest.sight.grid is not wildwest.grid:
+        wildwest.sight = LineOfSight(wildwest.grid)
+    return wildwest.sight
+
+
+def _hit_scan(wildwest, x: int, y: int, direction: int) -> None:
+    """the player's shot hits the first enemy in line at once"""
+    hit = line_of_sight(wildwest).first_hit(x, y, direction, ENEMY)
+    if hit is None:
+        return
+    enemies = wildwest.store["enemies"]
+    slot = wildwest.grid.get_id(*hit)
+    enemies.health[slot] -= 1
+    if enemies.health[slot] <= 0:
+        wildwest.kill("enemies", slot)
+
+
+def _move_bullets(wildwest, kind: str):
+    """
+    moves all bullets of a kind one tile,
+    bullets that can't fly any further are removed
+    returns the tiles of all bullets to check for hits
+    """
+    grid = wildwest.grid
+    store = wildwest.store[kind]
+    slots = store.slots()
+    old_x, old_y = store.x[slots], store.y[slots]
+    x, y, moved = step_many(old_x, old_y, store.direction[slots], grid, BLOCKS_BULLETS)
+    grid.remove_many(old_x[moved], old_y[moved], KINDS[kind])
+    grid.add_many(x[moved], y[moved], KINDS[kind], slots[moved])
+    store.x[slots] = x
+    store.y[slots] = y
+    wildwest.touch(kind, slots[moved])
+    wildwest.kill_many(kind, slots[~moved])
+    return x, y
+
+
+def _move_bullets_per_slot(wildwest, kind: str) -> list[tuple[int, int]]:
+    """_move_bullets() for a few bullets, one at a time, returns their tiles as a list"""
+    grid = wildwest.grid
+    store = wildwest.store[kind]
+    flag = KINDS[kind]
+    tiles, moved, stopped = [], [], []
+    for slot in store.slots().tolist():
+        x, y = int(store.x[slot]), int(store.y[slot])
+        tile = next_tile(x, y, int(store.direction[slot]), grid, BLOCKS_BULLETS)
+        if tile == (x, y):
+            stopped.append(slot)
+        else:
+            grid.move(x, y, *tile, flag)
+            store.x[slot], store.y[slot] = tile
+            moved.append(slot)
+        tiles.append(tile)
+    wildwest.touch(kind, moved)
+    for slot in stopped:
+        grid.remove(int(store.x[slot]), int(store.y[slot]), flag)
+        store.kill(slot)
+    wildwest.touch(kind, stopped)
+    return tiles
+
+
+def _shoot(wildwest, slots: np.ndarray) -> None:
+    """enemies that waited long enough shoot at a player they see"""
+    enemies = wildwest.store["enemies"]
+    enemies.shoot_counter[slots] = np.minimum(enemies.shoot_counter[slots] + 1, 3)
+    ready = slots[enemies.shoot_counter[slots] >= 3]
+    # only enemies with a clear shot at a player fire, towards the first player they see
+    sight = line_of_sight(wildwest)
+    fire = np.zeros(len(ready), bool)
+    aim = np.zeros(len(ready), np.int64)
+    for player in wildwest.players:
+        p = player.position
+        clear, direction = sight.clear_shot(enemies.x[ready], enemies.y[ready], p.x, p.y)
+        clear &= ~fire
+        aim[clear] = direction[clear]
+        fire |= clear
+        if wildwest.hit_scan and clear.any():
+            player.health -= int(np.count_nonzero(clear))
+            wildwest.emit("hit")
+            wildwest.touch_player()
+    ready, aim = ready[fire], aim[fire]
+    enemies.direction[ready] = aim
+    if not wildwest.hit_scan:
+        wildwest.spawn_many("enemy_bullets", enemies.x[ready], enemies.y[ready], direction=aim)
+    enemies.shoot_counter[ready] = 0
+
+
+def _shoot_per_slot(wildwest, slots: np.ndarray) -> None:
+    """_shoot() for a few enemies, one at a time"""
+    enemies = wildwest.store["enemies"]
+    sight = line_of_sight(wildwest)
+    shooters, aims = [], []
+    hits = [0] * len(wildwest.players)
+    for slot in slots.tolist():
+        counter = min(int(enemies.shoot_counter[slot]) + 1, 3)
+        enemies.shoot_counter[slot] = counter
+        if counter < 3:
+            continue
+        x, y = int(enemies.x[slot]), int(enemies.y[slot])
+        # towards the first player it sees
+        for i, player in enumerate(wildwest.players):
+            aim = sight.shot_direction(x, y, player.position.x, player.position.y)
+            if aim is not None:
+                shooters.append(slot)
+                aims.append(aim)
+                hits[i] += 1
+                break
+    if wildwest.hit_scan:
+        for player, n in zip(wildwest.players, hits):
+            if n:
+                player.health -= n
+                wildwest.emit("hit")
+                wildwest.touch_player()
+    if shooters:
+        shooters, aims = np.array(shooters), np.array(aims)
+        enemies.direction[shooters] = aims
+        if not wildwest.hit_scan:
+            wildwest.spawn_many("enemy_bullets", enemies.x[shooters], enemies.y[shooters], direction=aims)
+        enemies.shoot_counter[shooters] = 0
+
+
 def update(wildwest):
-    for r in wildwest.rider_enemies:
-        direction = random.choice(["up", "down", "left", "right", "wait", "wait", "wait", "wait"])
-        if direction != "wait":
-            new = get_next_position(r, direction, occupied = wildwest.walls + wildwest.rider_enemies +
-            wildwest.enemies + wildwest.cave_entrances + wildwest.coins)
-            r.x = new.x
-            r.y = new.y
-
-    for e in wildwest.enemies:
-        direction = random.choice(["up", "down", "left", "right"])
-        new = get_next_position(e.position, direction, occupied = wildwest.walls + wildwest.rider_enemies +
-        wildwest.enemies + wildwest.cave_entrances + wildwest.coins)
-        if new != e.position:
-            e.last_direction = direction  # Update last_direction on actual movement
-            e.position = new
+    grid = wildwest.grid
+    enemies = wildwest.store["enemies"]
+
+    with profiler.phase("update.walkers"):
+        _move_walkers(wildwest)
+        # a rider that walked onto a player kills them, like a player walking into a rider
+        for player in wildwest.players:
+            if grid.has(player.position.x, player.position.y, RIDER_ENEMY):
+                player.health = 0
+                wildwest.emit("you died")
+                wildwest.touch_player()
 
     # Move and check collisions for player's bullets
-    new_bullets = []
-    for bullet in wildwest.bullets:
-        new = get_next_position(bullet.position, bullet.direction,
-        occupied=wildwest.walls + wildwest.cave_entrances)
-        if new != bullet.position:
-            bullet.position = new
-            new_bullets.append(bullet)
-        for enemy in wildwest.enemies:
-            if bullet.position == enemy.position:
-                enemy.health -= 1
-                if enemy.health <= 0:
-                    wildwest.enemies.remove(enemy)
-    wildwest.bullets = new_bullets
+    with profiler.phase("update.bullets"):
+        if wildwest.store["bullets"].count < SCALAR_LIMIT:
+            dead = []
+            for x, y in _move_bullets_per_slot(wildwest, "bullets"):
+                if grid.has(x, y, ENEMY):
+                    slot = grid.get_id(x, y)
+                    enemies.health[slot] -= 1
+                    if enemies.health[slot] <= 0:
+                        dead.append(slot)
+            if dead:
+                wildwest.kill_many("enemies", np.array(dead))
+        else:
+            x, y = _move_bullets(wildwest, "bullets")
+            hit = (grid.flags[y, x] & ENEMY) != 0
+            targets = grid.ids[y[hit], x[hit]]
+            np.subtract.at(enemies.health, targets, np.int16(1))
+            wildwest.kill_many("enemies", targets[enemies.health[targets] <= 0])
 
     # Move and check collisions for enemy bullets
-    new_enemy_bullets = []
-    for bullet in wildwest.enemy_bullets:
-        new = get_next_position(bullet.position, bullet.direction,
-        occupied=wildwest.walls + wildwest.cave_entrances)
-        if new != bullet.position:
-            bullet.position = new
-            new_enemy_bullets.append(bullet)
-        if bullet.position == wildwest.player.position:
-            wildwest.player.health -= 1  # Player hit by enemy bullet
-    wildwest.enemy_bullets = new_enemy_bullets
+    with profiler.phase("update.enemy_bullets"):
+        if wildwest.store["enemy_bullets"].count < SCALAR_LIMIT:
+            tiles = _move_bullets_per_slot(wildwest, "enemy_bullets")
+            player_hits = [tiles.count((p.position.x, p.position.y)) for p in wildwest.players]
+        else:
+            x, y = _move_bullets(wildwest, "enemy_bullets")
+            player_hits = [
+                int(np.count_nonzero((x == p.position.x) & (y == p.position.y))) for p in wildwest.players
+            ]
+        for player, hits in zip(wildwest.players, player_hits):
+            player.health -= hits  # Player hit by enemy bullets
+            if hits:
+                wildwest.emit("hit")
+                wildwest.touch_player()
 
     # Enemy shooting behavior
-    for enemy in wildwest.enemies:
-        enemy.shoot_counter += 1
-        if enemy.shoot_counter >= 3:
-            bullet = EnemyBullet(position=enemy.position.copy(),
-                                 direction=enemy.last_direction)  # Use last_direction for shooting
-            wildwest.enemy_bullets.append(bullet)
-            enemy.shoot_counter = 0
-
-# define the level we will play
-wild_west = WildWest(
-    player=Player(position=Position(x=8, y=4)),
-)
+    with profiler.phase("update.shooting"):
+        slots = _active_slots(wildwest, "enemies")
+        if len(slots) < SCALAR_LIMIT:
+            _shoot_per_slot(wildwest, slots)
+        else:
+            _shoot(wildwest, slots)
+
+    wildwest.tick += 1
+
 
 def start_level(
-        wildwest: WildWest, level: list[str], start_position: Position, **kwargs
+        wildwest: WildWest,
+        level: list[str] | CompiledLevel,
+        start_position: Position,
+        projectile_caps: dict[str, int] | None = None,
+        **kwargs,
 ) -> None:
+    """
+    loads a text level or a compiled one (see level_files),
+    every kind of entity is spawned with one array operation,
+    projectile_caps limit the bullets in flight (DEFAULT_PROJECTILE_CAPS if None)
+    """
+    if not isinstance(level, CompiledLevel):
+        level = compile_level(level)
     wildwest.player.position = start_position
-    wildwest.traps = []
-    wildwest.walls = []
-    wildwest.coins = []
-    wildwest.cave_entrances = []
-    wildwest.bullets = []
-    wildwest.enemy_bullets = []
-    wildwest.rider_enemies = []
-    wildwest.enemies = []
-    for y, row in enumerate(level):  # y is a row number 0, 1, 2, ...
-        for x, tile in enumerate(row):  # x is a column number 0, 1, 2, ...
-            if tile == "T":
-                traps = Position(x=x, y=y)
-                wildwest.traps.append(traps)
-            if tile == "#":
-                wall = Position(x=x, y=y)
-                wildwest.walls.append(wall)
-            if tile == "X":
-                cave_entrance = Position(x=x, y=y)
-                wildwest.cave_entrances.append(cave_entrance)
-            if tile == "$":
-                coin = Position(x=x, y=y)
-                wildwest.coins.append(coin)
-            if tile == "R":
-                rider_enemy = Position(x=x, y=y)
-                wildwest.rider_enemies.append(rider_enemy)
-            if tile == "E":
-                enemy = Enemy(position = Position(x=x, y=y))
-                wildwest.enemies.append(enemy)
-
-start_level(wild_west, LEVELS[0], Position(x = 4, y = 8))
+    wildwest.reset(xsize=level.xsize, ysize=level.ysize)
+    wildwest.set_projectile_caps(DEFAULT_PROJECTILE_CAPS if projectile_caps is None else projectile_caps)
+    for kind, (x, y) in level.entities.items():
+        health = ENEMY_HEALTH if kind == "enemies" else 0
+        wildwest.spawn_many(kind, x, y, health=health)
+
+
+def new_game(seed: int | None = None) -> WildWest:
+    """a fresh game standing at the start of the first level"""
+    wildwest = WildWest(player=Player(position=Position(x=8, y=4)), seed=seed)
+    start_level(wildwest, LEVELS[0], Position(x=4, y=8), projectile_caps(0))
+    return wildwest
+
@@ -1,52 +1,67 @@
 # Graphics engine code
-import numpy as np
-import cv2
-from game_logic import wild_west, get_objects, move_command, update
-from cutscene import cutscene
-import pygame
-
-def play_song(songfile: str) -> None:
-    pygame.mixer.music.load(songfile)
-    pygame.mixer.music.play()
-
-# First cutscene
-cutscene(
-    text="Welcome to Wild West! Press any button to start",
-    wait=5,
-    songfile="start_end_game.mp3",
-    imagefile="wild_desert.png",
-)
-
-# Second cutscene
-cutscene(
-    text="An infamous gang is roaming the region and     attacking lone travellers",
-    wait=5,
-    songfile="start_end_game.mp3",
-    imagefile="gang.png",
-)
-
-# Third cutscene
-cutscene(
-    text="Try to get to your hometown safe",
-    wait=5,
-    songfile="start_end_game.mp3",
-    imagefile="hometown.png",
-)
-# Fourth cutscene
-cutscene(
-    text="Press Space to shoot and WASD to move",
-    wait=5,
-    songfile="start_end_game.mp3",
-    imagefile="desert2.png",
-)
-# Fifth cutscene
-cutscene(
-    text="Are you ready to embark on this treacherous    journey?",
-    wait=5,
-    songfile="start_end_game.mp3",
-    imagefile="wild_desert.png",
-)
-play_song("RODEO RANGER.mp3")
+"""
+The windowed Wild West game
+
+    python graphics_engine.py
+    python graphics_engine.py --skip-intro --startup-report
+
+Importing this module has no side effects, main() starts the game.
+cv2, pygame and the modules built on them are imported by main().
+"""
+import argparse
+import sys
+import time
+
+from profiling import profiler
+
+LEVEL_SONG = "RODEO RANGER.mp3"
+
+# the intro, one scene after another
+INTRO = [
+    dict(
+        text="Welcome to Wild West! Press any button to start",
+        wait=5,
+        songfile="start_end_game.mp3",
+        imagefile="wild_desert.png",
+    ),
+    dict(
+        text="An infamous gang is roaming the region and     attacking lone travellers",
+        wait=5,
+        songfile="start_end_game.mp3",
+        imagefile="gang.png",
+    ),
+    dict(
+        text="Try to get to your hometown safe",
+        wait=5,
+        songfile="start_end_game.mp3",
+        imagefile="hometown.png",
+    ),
+    dict(
+        text="Press Space to shoot and WASD to move",
+        wait=5,
+        songfile="start_end_game.mp3",
+        imagefile="desert2.png",
+    ),
+    dict(
+        text="Are you ready to embark on this treacherous    journey?",
+        wait=5,
+        songfile="start_end_game.mp3",
+        imagefile="wild_desert.png",
+    ),
+]
+NEW_LEVEL = [
+    dict(
+        text="Congratulations Cowboy, you just completed the level. Now the real challenge starts.",
+        songfile="start_end_game.mp3",
+        imagefile="wild_desert.png",
+    ),
+    dict(
+        text="Welcome To The New Level",
+        wait=5,
+        songfile="start_end_game.mp3",
+        imagefile="wild_desert.png",
+    ),
+]
 
 # map keyboard keys to move commands
 MOVES = {
@@ -64,111 +79,141 @@ MOVES = {
 SCREEN_SIZE_X, SCREEN_SIZE_Y = 640, 640
 TILE_SIZE = 64
 
-
-def read_image(filename: str) -> np.ndarray:
-    """
-    Reads an image from the given filename and doubles its size.
-    If the image file does not exist, an error is created.
-    """
-    img = cv2.imread(filename)  # sometimes returns None
-    return img
-
-
-IMAGES = {
-    "player": read_image("player1.png"),
-    "cactus": read_image("cactus.png"),
-    "coin": read_image("money.png"),
-    "cave_entrance": read_image("cave.png"),
-    "trap": read_image("trap.png"),
-    "bullet": read_image("bullet.png"),
-    "enemy_bullet": read_image("bullet.png"),
-    "rider enemy": read_image("rider_enemy.png"),
-    "enemy": read_image("enemy.png"),
-}
-
-
-def draw(obj, player_health, player_coins):
-    frame = np.zeros((SCREEN_SIZE_Y, SCREEN_SIZE_X, 3), np.uint8)
-    # Set background color
-    background_color = (165, 213, 250)  #OpenCV uses the BGR color space by default
-    frame[:, :] = background_color
-    for x, y, name in obj:
-        # calculate screen positions
-        xpos, ypos = x * TILE_SIZE, y * TILE_SIZE
-        image = IMAGES[name]
-        frame[ypos : ypos + TILE_SIZE, xpos : xpos + TILE_SIZE] = image
-
-
-    # Display player's health in the top right corner
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    health_text = f"Health: {player_health}"
-    text_size = cv2.getTextSize(health_text, font, 1, 2)[0]
-    text_x = SCREEN_SIZE_X - text_size[0] - 10
-    text_y = 30
-    cv2.putText(frame, health_text, (text_x, text_y), font, 1, (0, 0, 0), 2, cv2.LINE_AA)
-
-    # Display player's coins below health
-    coins_text = f"Coins: {player_coins}"
-    coins_text_size = cv2.getTextSize(coins_text, font, 1, 2)[0]
-    coins_text_x = SCREEN_SIZE_X - coins_text_size[0] - 10
-    coins_text_y = text_y + text_size[1] + 10  # Add a small margin below the health text
-    cv2.putText(frame, coins_text, (coins_text_x, coins_text_y), font, 1, (0, 0, 0), 2, cv2.LINE_AA)
-
-    cv2.imshow("Wild West", frame)
-
-
-UPDATE_MAX = 25
-
-
-update_cycle = UPDATE_MAX
-exit_game = False
-
-while not exit_game:
-    # draw
-    obj = get_objects(wild_west)
-    player_health = wild_west.player.health  # Get player's health
-    player_coins = wild_west.player.coins  # Get player's coins
-    draw(obj, player_health, player_coins)  # Pass values to the draw function
-    update_cycle -= 1
-    if update_cycle <= 0:
-        update(wild_west)
-        update_cycle = UPDATE_MAX
-
-    # handle keyboard input
-    key = chr(cv2.waitKey(1) & 0xFF)
-    if key == "q":
-        exit_game = True
-    if key in MOVES:
-        move_command(wild_west, wild_west.player, MOVES[key])
-    if wild_west.event == "new level":
-        wild_west.event = ""  # delete the event
-        cutscene(
-            text="Congratulations Cowboy, you just completed the level. Now the real challenge starts.",
-            songfile="start_end_game.mp3",
-            imagefile="wild_desert.png",
-        )
-        cutscene(
-            text="Welcome To The New Level",
-            wait=5,
-            songfile="start_end_game.mp3",
-            imagefile="wild_desert.png",
-        )
-        play_song("RODEO RANGER.mp3") #playing the song at the start of the game
-    elif wild_west.event == "game over": #game over cutscene
-        cutscene(
-            text="Congratulations! You arrived to your hometown  safe and sound!",
-            wait=5,
-            songfile="start_end_game.mp3",
-            imagefile="safe_arrival.png",
-        )
-        exit_game = True
-    elif wild_west.event == "you died": #death cutscene
-        cutscene(
-            text="Game over. Good luck next time, Cowboy.",
-            wait=5,
-            songfile="start_end_game.mp3",
-            imagefile="wild_desert.png",
-        )
-        exit_game = True
-
-cv2.destroyAllWindows()
+#
+# game speed, independent of how fast the machine draws
+#
+TICK_RATE = 3  # simulation updates per second
+MAX_FPS = 30  # at most this many frames per second
+REWIND_SECONDS = 3  # how far back "r" goes
+AUTOSAVE_TICKS = 10 * TICK_RATE  # the game is written to AUTOSAVE_FILE this often
+AUTOSAVE_FILE = "autosave.snapshot"  # load it with snapshots.load_snapshot after a crash
+RECORDING_FILE = "last_game.json"  # play it again with: python replay.py last_game.json
+
+
+def main(argv: list[str] | None = None) -> None:
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Play Wild West")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--skip-intro", action="store_true")
+    parser.add_argument("--startup-report", action="store_true", help="print how long starting up took")
+    args = parser.parse_args(argv)
+    startup = []  # (phase, seconds since main() started) until the first frame is on screen
+
+    import cv2
+    from audio import audio, SOUND_EFFECTS
+    from cutscene import cutscene, Scene, player as cutscene_player
+    from game_clock import FrameLimiter
+    from game_logic import new_game
+    from levels import LEVELS
+    from renderer import Renderer, load_sprites
+    from simulation import Simulation, REWIND
+    startup.append(("imports", time.perf_counter() - started))
+
+    renderer = Renderer(load_sprites(), (SCREEN_SIZE_X, SCREEN_SIZE_Y), TILE_SIZE)
+    startup.append(("sprites", time.perf_counter() - started))
+    wild_west = new_game(args.seed)
+    startup.append(("world", time.perf_counter() - started))
+
+    if not args.skip_intro:
+        cutscene_player.play_sequence([Scene(**scene) for scene in INTRO])
+        startup.append(("intro", time.perf_counter() - started))
+    audio.play_music(LEVEL_SONG)  # crossfades on the audio thread, the loop does not wait for it
+
+    show_profile = False  # frame timings on screen, toggled with "p"
+    profile_on_screen = False
+
+    def draw(state):
+        nonlocal profile_on_screen
+        # only tiles that changed since the last frame are redrawn
+        changed = renderer.draw(state)
+        if show_profile:
+            frame = renderer.frame.copy()
+            for i, line in enumerate(reversed(profiler.overlay_lines())):
+                cv2.putText(frame, line, (10, SCREEN_SIZE_Y - 10 - 18 * i), cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 0), 1)
+            cv2.imshow("Wild West", frame)
+        elif changed or profile_on_screen:
+            cv2.imshow("Wild West", renderer.frame)
+        profile_on_screen = show_profile
+
+    # the world runs on its own thread, this one only draws, reads keys and plays the cutscenes
+    simulation = Simulation(wild_west, TICK_RATE, REWIND_SECONDS * TICK_RATE, AUTOSAVE_TICKS, AUTOSAVE_FILE)
+    simulation.start()
+    exit_game = False
+    drawn = None  # version of the state on screen
+    frames = FrameLimiter(MAX_FPS)  # a key press ends the wait early, but not the frame interval
+
+    while not exit_game:
+        # draw the newest state the simulation published, without waiting for it
+        state = simulation.front
+        if (state.version != drawn or show_profile) and frames.frame_due():
+            with profiler.phase("draw"):
+                draw(state)  # the renderer looks up what is under the camera
+            drawn = state.version
+
+        # handle keyboard input, waiting until the next frame is due
+        with profiler.phase("wait_key"):
+            key = chr(cv2.waitKey(frames.wait_ms()) & 0xFF)
+        if startup:
+            # the first frame is on screen now
+            startup.append(("first frame", time.perf_counter() - started))
+            if args.startup_report:
+                report = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in startup)
+                print(f"startup: {report}", file=sys.stderr)
+            startup = None
+        if key == "q":
+            exit_game = True
+        if key == "p":
+            show_profile = not show_profile
+            if show_profile:
+                profiler.enable()
+            drawn = None
+        if key == "r":
+            simulation.send(REWIND)
+        if key in MOVES:
+            simulation.send(MOVES[key])
+
+        # everything that happened in the world since the last frame, in order
+        for event in simulation.drain_events():
+            if event in SOUND_EFFECTS:
+                audio.play_sfx(event)
+                continue
+            with profiler.phase("cutscene"):
+                if event == "new level":
+                    # the simulation is paused, the world holds still while we look at it
+                    last_level = wild_west.level_number == len(LEVELS) - 1
+                    cutscene_player.play_sequence(
+                        [Scene(**scene) for scene in NEW_LEVEL],
+                        prefetch=("safe_arrival.png",) if last_level else (),
+                    )
+                    audio.play_music(LEVEL_SONG) #playing the song at the start of the game
+                    simulation.resume()
+                elif event == "game over": #game over cutscene
+                    cutscene(
+                        text="Congratulations! You arrived to your hometown  safe and sound!",
+                        wait=5,
+                        songfile="start_end_game.mp3",
+                        imagefile="safe_arrival.png",
+                    )
+                    exit_game = True
+                elif event == "you died": #death cutscene
+                    cutscene(
+                        text="Game over. Good luck next time, Cowboy.",
+                        wait=5,
+                        songfile="start_end_game.mp3",
+                        imagefile="wild_desert.png",
+                    )
+                    exit_game = True
+            if exit_game:
+                break
+
+    simulation.stop()
+    cv2.destroyAllWindows()
+    audio.close()
+    simulation.recorder.save(RECORDING_FILE, wild_west)
+    if profiler.enabled:
+        profiler.save("frame_profile.json")
+        profiler.save("frame_profile.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Headless Wild West: play the game logic without a window
+
+Drives move_command/update on a WildWest from scripted or random input.
+Only the game logic is imported, no cv2 and no pygame.
+
+Run many episodes on all cores for balance testing:
+
+    python headless.py --episodes 10000 --max-ticks 2000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from endless import EndlessWorld
+from game_logic import new_game, move_command, update
+from levels import LEVELS
+
+# actions a random player picks from, "wait" does nothing
+ACTIONS = ["up", "down", "left", "right", "shot", "wait"]
+# events that end an episode
+ENDINGS = ("game over", "you died")
+
+
+def run_episode(
+    seed: int,
+    max_ticks: int = 2000,
+    script: list[str] | None = None,
+    moves_per_tick: int = 1,
+    endless: int | None = None,
+    delta_dir: str | None = None,
+) -> dict:
+    """
+    Plays one game until it is won, lost or max_ticks is reached.
+
+    With a script the player performs its actions in order (and then waits),
+    otherwise the actions are random. Every tick the player acts
+    moves_per_tick times, then update() runs once.
+
+    The windowed game never ends on health alone, here running
+    out of health ends the episode as "out of health".
+
+    With `endless` (a world seed) the game is played in an endless
+    desert instead of the levels, its changed chunks go to a directory
+    of the episode in `delta_dir` if one is given.
+    """
+    player_rng = np.random.default_rng([seed, 1])
+    wildwest = new_game(seed)
+    world = None
+    if endless is not None:
+        episode_dir = os.path.join(delta_dir, f"episode_{seed}") if delta_dir else None
+        world = EndlessWorld(endless, delta_dir=episode_dir)
+        world.start(wildwest)
+    actions = iter(script or [])
+
+    outcome = "timeout"
+    tick = 0
+    while tick < max_ticks:
+        for _ in range(moves_per_tick):
+            if script is not None:
+                action = next(actions, "wait")
+            else:
+                action = ACTIONS[player_rng.integers(len(ACTIONS))]
+            if action != "wait":
+                move_command(wildwest, wildwest.player, action)
+                if world:
+                    world.follow(wildwest)
+            for event in wildwest.drain_events():
+                if event in ENDINGS:
+                    outcome = event
+            if outcome in ENDINGS:
+                break
+        if outcome in ENDINGS:
+            break
+        update(wildwest)
+        tick += 1
+        for event in wildwest.drain_events():
+            if event in ENDINGS:
+                outcome = event
+        if outcome in ENDINGS:
+            break
+        if wildwest.player.health <= 0:
+            outcome = "out of health"
+            break
+    if world:
+        world.close()
+
+    return {
+        "seed": seed,
+        "outcome": outcome,
+        "ticks": tick,
+        "levels_completed": wildwest.level_number,
+        "coins": wildwest.player.coins,
+        "health": wildwest.player.health,
+    }
+
+
+def _run_episode_args(args: tuple) -> dict:
+    return run_episode(*args)
+
+
+def _quiet_worker() -> None:
+    """the game logic prints every coin pickup, keep workers silent"""
+    sys.stdout = open(os.devnull, "w")
+
+
+def run_batch(
+    episodes: int,
+    seed: int = 0,
+    max_ticks: int = 2000,
+    script: list[str] | None = None,
+    moves_per_tick: int = 1,
+    workers: int | None = None,
+    endless: int | None = None,
+    delta_dir: str | None = None,
+) -> dict:
+    """runs many episodes on a process pool and summarizes them"""
+    workers = workers or os.cpu_count()
+    jobs = [(seed + i, max_ticks, script, moves_per_tick, endless, delta_dir) for i in range(episodes)]
+    # a few chunks per worker keeps every core busy until the end
+    chunksize = max(1, episodes // (workers * 8))
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_quiet_worker) as pool:
+        results = list(pool.imap_unordered(_run_episode_args, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    return summarize(results, elapsed, workers)
+
+
+def summarize(results: list[dict], elapsed: float, workers: int) -> dict:
+    episodes = len(results)
+    ticks = sum(r["ticks"] for r in results)
+    outcomes = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    return {
+        "episodes": episodes,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "ticks": ticks,
+        "ticks_per_second": round(ticks / elapsed) if elapsed else 0,
+        "win_rate": outcomes.get("game over", 0) / episodes,
+        "death_rate": (outcomes.get("you died", 0) + outcomes.get("out of health", 0)) / episodes,
+        "outcomes": outcomes,
+        # share of episodes that got through each level
+        "level_completion": [
+            sum(r["levels_completed"] > level for r in results) / episodes
+            for level in range(len(LEVELS))
+        ],
+        "mean_coins": sum(r["coins"] for r in results) / episodes,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run headless Wild West episodes on all cores")
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first episode")
+    parser.add_argument("--max-ticks", type=int, default=2000)
+    parser.add_argument("--moves-per-tick", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="default: all cores")
+    parser.add_argument("--script", help="file with one action per line instead of random input")
+    parser.add_argument("--endless", type=int, default=None, help="play an endless desert with this world seed")
+    parser.add_argument("--delta-dir", help="keep the changed chunks of the endless desert in this directory")
+    args = parser.parse_args(argv)
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = [line.strip() for line in f if line.strip()]
+
+    report = run_batch(
+        episodes=args.episodes,
+        seed=args.seed,
+        max_ticks=args.max_ticks,
+        script=script,
+        moves_per_tick=args.moves_per_tick,
+        workers=args.workers,
+        endless=args.endless,
+        delta_dir=args.delta_dir,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
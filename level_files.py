@@ -0,0 +1,166 @@
+"""
+Compiled binary levels
+
+Text levels (lists of strings like in levels.py, or lands from
+generate_land) are compiled into a tile array plus a table of the
+positions of every kind of entity, so start_level can spawn each kind
+with one array operation instead of looking at every character.
+
+Compiled levels can be written to a file and memory-mapped back.
+File layout, little endian, every section starts on a 4 byte boundary:
+
+    header   magic b"WWLV", version u32, xsize u32, ysize u32, count u32
+             per kind of TILES, crc32 u32 of everything after the header
+    tiles    ysize * xsize tile characters, uint8
+    entities per kind of TILES: count x positions int32, then count y positions int32
+
+    python level_files.py levels/            # compiles LEVELS into levels/level1.wwl ...
+    python level_files.py --land 2000 --seed 1 land.wwl
+"""
+import argparse
+import os
+import zlib
+
+import numpy as np
+
+# tile characters and the kind of entity they stand for
+TILES = {
+    "T": "traps",
+    "#": "walls",
+    "X": "cave_entrances",
+    "$": "coins",
+    "R": "rider_enemies",
+    "E": "enemies",
+}
+
+MAGIC = b"WWLV"
+VERSION = 1
+HEADER = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("xsize", "<u4"),
+    ("ysize", "<u4"),
+    ("counts", "<u4", (len(TILES),)),
+    ("crc32", "<u4"),
+])
+
+
+class LevelFileError(ValueError):
+    """a level file that is not a compiled level or got damaged"""
+
+
+def _padded(n: int) -> int:
+    return (n + 3) & ~3
+
+
+class CompiledLevel:
+    """
+    the tiles of a level as a (ysize, xsize) uint8 array and the
+    (x, y) int32 position arrays of every kind of entity on it
+    """
+
+    def __init__(self, tiles: np.ndarray, entities: dict[str, tuple[np.ndarray, np.ndarray]]):
+        self.tiles = tiles
+        self.entities = entities
+
+    @property
+    def xsize(self) -> int:
+        return self.tiles.shape[1]
+
+    @property
+    def ysize(self) -> int:
+        return self.tiles.shape[0]
+
+    def to_text(self) -> list[str]:
+        return [row.tobytes().decode("ascii") for row in self.tiles]
+
+
+def compile_level(level: list[str] | str) -> CompiledLevel:
+    """compiles a list of rows, or a land string with one row per line"""
+    if isinstance(level, str):
+        level = level.split()
+    tiles = np.frombuffer("".join(level).encode("ascii"), np.uint8)
+    if tiles.size != len(level) * len(level[0]):
+        raise ValueError("all rows of a level must have the same length")
+    tiles = tiles.reshape(len(level), len(level[0]))
+    entities = {}
+    for tile, kind in TILES.items():
+        y, x = np.nonzero(tiles == ord(tile))
+        entities[kind] = (x.astype(np.int32), y.astype(np.int32))
+    return CompiledLevel(tiles, entities)
+
+
+def level_bytes(level: CompiledLevel) -> bytes:
+    """the compiled level in the file layout"""
+    sections = [level.tiles.tobytes().ljust(_padded(level.tiles.size), b"\0")]
+    for kind in TILES.values():
+        x, y = level.entities[kind]
+        sections.append(x.astype("<i4").tobytes())
+        sections.append(y.astype("<i4").tobytes())
+    body = b"".join(sections)
+    header = np.zeros((), HEADER)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["xsize"] = level.xsize
+    header["ysize"] = level.ysize
+    header["counts"] = [len(level.entities[kind][0]) for kind in TILES.values()]
+    header["crc32"] = zlib.crc32(body)
+    return header.tobytes() + body
+
+
+def save_level(filename: str, level: CompiledLevel | list[str] | str) -> None:
+    if not isinstance(level, CompiledLevel):
+        level = compile_level(level)
+    with open(filename, "wb") as f:
+        f.write(level_bytes(level))
+
+
+def load_level(filename: str) -> CompiledLevel:
+    """
+    memory-maps a compiled level file, the arrays are read-only views of it.
+    Raises LevelFileError if the file is not a level or its checksum is wrong.
+    """
+    data = np.memmap(filename, np.uint8, mode="r")
+    if data.size < HEADER.itemsize:
+        raise LevelFileError(f"{filename}: too short for a level file")
+    header = data[:HEADER.itemsize].view(HEADER)[0]
+    if header["magic"] != MAGIC or header["version"] != VERSION:
+        raise LevelFileError(f"{filename}: not a version {VERSION} level file")
+    body = data[HEADER.itemsize:]
+    if zlib.crc32(body) != header["crc32"]:
+        raise LevelFileError(f"{filename}: checksum mismatch, the file is damaged")
+
+    xsize, ysize = int(header["xsize"]), int(header["ysize"])
+    offset = _padded(xsize * ysize)
+    expected = offset + 8 * int(header["counts"].sum())
+    if body.size != expected:
+        raise LevelFileError(f"{filename}: {body.size} bytes of level data, expected {expected}")
+    tiles = body[:xsize * ysize].reshape(ysize, xsize)
+    entities = {}
+    for kind, count in zip(TILES.values(), header["counts"].tolist()):
+        x = body[offset:offset + 4 * count].view("<i4")
+        y = body[offset + 4 * count:offset + 8 * count].view("<i4")
+        entities[kind] = (x, y)
+        offset += 8 * count
+    return CompiledLevel(tiles, entities)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compile Wild West levels into binary level files")
+    parser.add_argument("output", help="directory for the LEVELS, or the file for --land")
+    parser.add_argument("--land", type=int, help="compile a generated land of this size instead")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.land:
+        import generate_land
+        save_level(args.output, generate_land.create_land_fast(args.land, args.land, args.seed))
+        return
+    from levels import LEVELS
+    os.makedirs(args.output, exist_ok=True)
+    for number, level in enumerate(LEVELS, 1):
+        save_level(os.path.join(args.output, f"level{number}.wwl"), level)
+
+
+if __name__ == "__main__":
+    main()
@@ -36,4 +36,11 @@ Level3 = [
     "##.$...#.#",
     "#.....#..."
 ]
-LEVELS = [Level1, Level2, Level3]
\ No newline at end of file
+LEVELS = [Level1, Level2, Level3]
+
+# most bullets of the player and of the enemies in flight at once on each level
+PROJECTILE_CAPS = [
+    {"bullets": 16, "enemy_bullets": 32},
+    {"bullets": 16, "enemy_bullets": 48},
+    {"bullets": 16, "enemy_bullets": 64},
+]
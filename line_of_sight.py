@@ -0,0 +1,83 @@
+"""
+Line-of-sight index for shooting
+
+Walls and cave entrances stop bullets and never move within a level, so
+every row and every column of the map splits into runs of open tiles
+between them. For every tile the index keeps where its run starts and
+ends in its row and in its column. Two tiles in the same row see each
+other if their runs start at the same tile, and a shot along a row can
+fly no further than the end of the run.
+"""
+import numpy as np
+
+from occupancy import OccupancyGrid, BLOCKS_BULLETS
+
+# direction codes, see entities.DIRECTIONS
+UP, DOWN, LEFT, RIGHT = range(4)
+
+
+def _runs(blocked: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """first and last index of the open run every tile of each row is in"""
+    n = blocked.shape[1]
+    index = np.arange(n)
+    start = np.maximum.accumulate(np.where(blocked, index, -1), axis=1) + 1
+    end = np.minimum.accumulate(np.where(blocked, index, n)[:, ::-1], axis=1)[:, ::-1] - 1
+    return start, end
+
+
+class LineOfSight:
+    """the open runs of every row and column of a level"""
+
+    def __init__(self, grid: OccupancyGrid):
+        self.grid = grid
+        self.blocked = (grid.flags & BLOCKS_BULLETS) != 0
+        dtype = np.int16 if max(grid.xsize, grid.ysize) < 2**15 else np.int32
+        row_start, row_end = _runs(self.blocked)
+        col_start, col_end = _runs(self.blocked.T)
+        self.row_start, self.row_end = row_start.astype(dtype), row_end.astype(dtype)
+        self.col_start, self.col_end = col_start.T.astype(dtype), col_end.T.astype(dtype)
+
+    def clear_shot(self, x: np.ndarray, y: np.ndarray, tx: int, ty: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        which of the shooters at (x, y) could hit the tile (tx, ty) in a straight line,
+        and the direction code they would have to shoot in
+        """
+        same_row = (y == ty) & (x != tx) & (self.row_start[y, x] == self.row_start[ty, tx])
+        same_col = (x == tx) & (y != ty) & (self.col_start[y, x] == self.col_start[ty, tx])
+        clear = (same_row | same_col) & ~self.blocked[y, x] & ~self.blocked[ty, tx]
+        direction = np.where(
+            same_row,
+            np.where(tx > x, RIGHT, LEFT),
+            np.where(ty > y, DOWN, UP),
+        )
+        return clear, direction
+
+    def shot_direction(self, x: int, y: int, tx: int, ty: int) -> int | None:
+        """clear_shot() for one shooter, the direction code or None if it has no clear shot"""
+        if self.blocked[y, x] or self.blocked[ty, tx]:
+            return None
+        if y == ty and x != tx and self.row_start[y, x] == self.row_start[ty, tx]:
+            return RIGHT if tx > x else LEFT
+        if x == tx and y != ty and self.col_start[y, x] == self.col_start[ty, tx]:
+            return DOWN if ty > y else UP
+        return None
+
+    def first_hit(self, x: int, y: int, direction: int, flag: int) -> tuple[int, int] | None:
+        """
+        the first tile after (x, y) in the direction that has `flag` in the grid,
+        or None if the shot hits a wall or the edge of the map before
+        """
+        if self.blocked[y, x]:
+            return None
+        flags = self.grid.flags
+        if direction == RIGHT:
+            found = np.flatnonzero(flags[y, x + 1:self.row_end[y, x] + 1] & flag)
+            return (x + 1 + int(found[0]), y) if len(found) else None
+        if direction == LEFT:
+            found = np.flatnonzero(flags[y, self.row_start[y, x]:x][::-1] & flag)
+            return (x - 1 - int(found[0]), y) if len(found) else None
+        if direction == DOWN:
+            found = np.flatnonzero(flags[y + 1:self.col_end[y, x] + 1, x] & flag)
+            return (x, y + 1 + int(found[0])) if len(found) else None
+        found = np.flatnonzero(flags[self.col_start[y, x]:y, x][::-1] & flag)
+        return (x, y - 1 - int(found[0])) if len(found) else None
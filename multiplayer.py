@@ -0,0 +1,433 @@
+"""
+Multiplayer server for Wild West
+
+One GameServer owns the world and runs update() and move_command for
+every connected player on an asyncio loop, so it stays on one core and
+needs no locks. Clients connect over TCP or a Unix socket, send one byte
+per action, and receive the state of the world as a stream of messages:
+
+    KEYFRAME  the whole map, sent when a client joins or a level starts
+    DELTA     the tiles whose contents changed since the last tick
+
+A tile's contents are its occupancy grid flags, which is what
+get_objects() lists (minus how many bullets share a tile), so a client
+can draw the world from them. Every message also lists all players and
+the events of the tick. The messages of a tick are encoded once and the
+same bytes go to every client; a client that can't keep up gets no
+deltas until its socket drains, and then a keyframe.
+
+    python multiplayer.py --port 7777
+    python multiplayer.py --unix /tmp/wild_west.sock
+    python multiplayer.py --bots 32 --ticks 300   # load test with loopback clients
+"""
+import argparse
+import asyncio
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from game_logic import EVENTS, PLAYER_HEALTH, Player, Position, get_changes, new_game, move_command, update
+from profiling import profiler
+
+ACTIONS = ("up", "down", "left", "right", "jump", "shot")  # the byte a client sends is the index
+START = (4, 8)  # where every level starts, see game_logic.new_game
+MAX_ACTIONS = 4  # actions a client may queue, more than that in one tick are dropped
+MAX_BUFFER = 256 * 1024  # bytes waiting for a client before it gets no more deltas
+COMPRESS_MIN = 512  # message bodies larger than this are zlib compressed
+
+# message types, COMPRESSED is or-ed in when the body is compressed
+WELCOME, KEYFRAME, DELTA = 1, 2, 3
+COMPRESSED = 0x80
+# length of what follows, message type, tick
+HEADER = struct.Struct("<IBI")
+# level number, map size
+KEYFRAME_HEADER = struct.Struct("<HHH")
+# number of players, changed tiles and events
+COUNTS = struct.Struct("<HII")
+PLAYER_DTYPE = np.dtype([("id", "<u2"), ("x", "<u2"), ("y", "<u2"), ("health", "<i2"), ("coins", "<i4")])
+EVENT_DTYPE = np.dtype([("player", "<u2"), ("event", "u1")])
+
+
+class ProtocolError(ValueError):
+    """bytes that are not a Wild West message"""
+
+
+#
+# encoding
+#
+def _message(kind: int, tick: int, body: bytes) -> bytes:
+    if len(body) > COMPRESS_MIN:
+        body = zlib.compress(body, 1)
+        kind |= COMPRESSED
+    return HEADER.pack(len(body) + HEADER.size - 4, kind, tick) + body
+
+
+def encode_welcome(tick: int, player_id: int) -> bytes:
+    return _message(WELCOME, tick, struct.pack("<H", player_id))
+
+
+def _tail(players: np.ndarray, tiles: np.ndarray, values: np.ndarray, events: np.ndarray) -> bytes:
+    return b"".join([
+        COUNTS.pack(len(players), len(tiles), len(events)),
+        players.tobytes(),
+        tiles.astype("<u4").tobytes(),
+        values.astype(np.uint8).tobytes(),
+        events.tobytes(),
+    ])
+
+
+def encode_keyframe(tick: int, level_number: int, flags: np.ndarray, players: np.ndarray, events: np.ndarray) -> bytes:
+    ysize, xsize = flags.shape
+    empty = np.zeros(0, np.uint32)
+    body = KEYFRAME_HEADER.pack(level_number, xsize, ysize) + flags.tobytes() + _tail(players, empty, empty, events)
+    return _message(KEYFRAME, tick, body)
+
+
+def encode_delta(tick: int, tiles: np.ndarray, values: np.ndarray, players: np.ndarray, events: np.ndarray) -> bytes:
+    return _message(DELTA, tick, _tail(players, tiles, values, events))
+
+
+def decode(message: bytes) -> dict:
+    """one message without its length prefix, as a dict"""
+    kind, tick = struct.unpack_from("<BI", message)
+    body = message[5:]
+    if kind & COMPRESSED:
+        body = zlib.decompress(body)
+        kind &= ~COMPRESSED
+    result = {"type": kind, "tick": tick}
+    if kind == WELCOME:
+        result["player_id"] = struct.unpack("<H", body)[0]
+        return result
+    if kind not in (KEYFRAME, DELTA):
+        raise ProtocolError(f"unknown message type {kind}")
+    offset = 0
+    if kind == KEYFRAME:
+        result["level_number"], xsize, ysize = KEYFRAME_HEADER.unpack_from(body)
+        offset = KEYFRAME_HEADER.size
+        result["flags"] = np.frombuffer(body, np.uint8, xsize * ysize, offset).reshape(ysize, xsize)
+        offset += xsize * ysize
+    n_players, n_tiles, n_events = COUNTS.unpack_from(body, offset)
+    offset += COUNTS.size
+    result["players"] = np.frombuffer(body, PLAYER_DTYPE, n_players, offset)
+    offset += n_players * PLAYER_DTYPE.itemsize
+    result["tiles"] = np.frombuffer(body, "<u4", n_tiles, offset)
+    offset += n_tiles * 4
+    result["values"] = np.frombuffer(body, np.uint8, n_tiles, offset)
+    offset += n_tiles
+    result["events"] = np.frombuffer(body, EVENT_DTYPE, n_events, offset)
+    return result
+
+
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    size = struct.unpack("<I", await reader.readexactly(4))[0]
+    return await reader.readexactly(size)
+
+
+#
+# the server
+#
+class Connection:
+    """one connected client and its player"""
+
+    def __init__(self, player_id: int, player: Player, writer: asyncio.StreamWriter):
+        self.player_id = player_id
+        self.player = player
+        self.writer = writer
+        self.actions = deque()  # at most MAX_ACTIONS, see GameServer.handle_client
+        self.needs_keyframe = True
+
+
+class GameServer:
+    """the authoritative world of a multiplayer game"""
+
+    def __init__(self, seed: int | None = None, tick_rate: float = 3):
+        self.seed = seed
+        self.tick_interval = 1.0 / tick_rate
+        self.wildwest = new_game(seed)
+        self.connections: dict[int, Connection] = {}
+        self.next_id = 1
+        self.tick = 0  # ticks since the server started, unlike wildwest.tick it never goes back
+        self.version = 0  # world version the last message brought the clients to, see get_changes()
+        self.tiles = {}  # (object type, slot) -> tile of every entity as the clients know it
+        self.last_grid = None
+        self.last_players = None
+        self.sent_bytes = 0
+
+    def _seat_players(self) -> None:
+        """the players of the world in joining order, the first one is pursued by the enemies"""
+        players = [c.player for c in self.connections.values()]
+        if players:
+            self.wildwest.players = players
+            self.wildwest.player = players[0]
+
+    def join(self, writer: asyncio.StreamWriter) -> Connection:
+        player = Player(position=Position(x=START[0], y=START[1]))
+        connection = Connection(self.next_id, player, writer)
+        self.next_id = self.next_id % 0xFFFF + 1
+        self.connections[connection.player_id] = connection
+        self._seat_players()
+        writer.write(encode_welcome(self.tick, connection.player_id))
+        return connection
+
+    def leave(self, connection: Connection) -> None:
+        self.connections.pop(connection.player_id, None)
+        self._seat_players()
+
+    def _respawn(self, player: Player) -> None:
+        player.position = Position(x=START[0], y=START[1])
+        player.health = PLAYER_HEALTH
+
+    def step(self) -> None:
+        """one tick: the queued actions of every player, then update(), then the broadcast"""
+        wildwest = self.wildwest
+        events = []
+        restart = False
+        for connection in list(self.connections.values()):
+            player = connection.player
+            while connection.actions:
+                with profiler.phase("move_command"):
+                    move_command(wildwest, player, connection.actions.popleft())
+                happened = wildwest.drain_events()
+                events += [(connection.player_id, EVENTS.index(e)) for e in happened]
+                if "new level" in happened:
+                    # the other players follow to the start of the new level
+                    for other in self.connections.values():
+                        other.player.position = Position(x=START[0], y=START[1])
+                    connection.actions.clear()
+                if "you died" in happened:
+                    self._respawn(player)
+                if "game over" in happened:
+                    restart = True
+        if restart:
+            self.wildwest = wildwest = new_game(self.seed)
+            for connection in self.connections.values():
+                self._respawn(connection.player)
+            self._seat_players()
+        with profiler.phase("update"):
+            update(wildwest)
+        self.tick += 1
+        wildwest.drain_events()  # hits show in the players' health
+        for connection in self.connections.values():
+            if connection.player.health <= 0:
+                events.append((connection.player_id, EVENTS.index("you died")))
+                self._respawn(connection.player)
+        with profiler.phase("broadcast"):
+            self.broadcast(np.array(events, EVENT_DTYPE))
+
+    def _players(self) -> np.ndarray:
+        players = np.zeros(len(self.connections), PLAYER_DTYPE)
+        for i, c in enumerate(self.connections.values()):
+            p = c.player
+            players[i] = (c.player_id, p.position.x, p.position.y, p.health, p.coins)
+        return players
+
+    def _changed_tiles(self, changes) -> tuple[np.ndarray, np.ndarray]:
+        """the tiles the changed entities left or entered, and their flags now"""
+        xsize = self.wildwest.grid.xsize
+        tiles = set()
+        for x, y, name, slot in changes.updated:
+            old = self.tiles.get((name, slot))
+            if old is not None:
+                tiles.add(old)
+            self.tiles[name, slot] = tile = y * xsize + x
+            tiles.add(tile)
+        for name, slot in changes.removed:
+            old = self.tiles.pop((name, slot), None)
+            if old is not None:
+                tiles.add(old)
+        tiles = np.fromiter(sorted(tiles), np.uint32, len(tiles))
+        return tiles, self.wildwest.grid.flags.reshape(-1)[tiles]
+
+    def broadcast(self, events: np.ndarray) -> None:
+        """
+        sends the changes of this tick to every client, each message is encoded once;
+        the changed tiles come from get_changes(), so a delta costs what changed, not the map size
+        """
+        wildwest = self.wildwest
+        flags = wildwest.grid.flags
+        players = self._players()
+        keyframe = None
+        new_level = wildwest.grid.origin is not self.last_grid
+        changes = get_changes(wildwest, 0 if new_level else self.version)
+        self.version = changes.version
+        if changes.full:
+            # a new level, everybody starts from a keyframe
+            for connection in self.connections.values():
+                connection.needs_keyframe = True
+            self.tiles = {(name, slot): y * wildwest.grid.xsize + x for x, y, name, slot in changes.updated}
+            delta = None
+        else:
+            delta = encode_delta(self.tick, *self._changed_tiles(changes), players, events)
+        self.last_grid = wildwest.grid.origin
+        self.last_players = players
+        for connection in self.connections.values():
+            transport = connection.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_BUFFER:
+                connection.needs_keyframe = True  # it missed deltas, start it over once it caught up
+                continue
+            if connection.needs_keyframe:
+                if keyframe is None:
+                    keyframe = encode_keyframe(self.tick, wildwest.level_number, flags, players, events)
+                message = keyframe
+                connection.needs_keyframe = False
+            else:
+                message = delta
+            connection.writer.write(message)
+            self.sent_bytes += len(message)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = self.join(writer)
+        try:
+            while True:
+                data = await reader.read(64)
+                if not data:
+                    break
+                for code in data:
+                    # the actions of this tick are kept, later ones are dropped
+                    if code < len(ACTIONS) and len(connection.actions) < MAX_ACTIONS:
+                        connection.actions.append(ACTIONS[code])
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(connection)
+            writer.close()
+
+    async def run(self, ticks: int | None = None) -> None:
+        """ticks at the tick rate (forever when `ticks` is None), idle while nobody is connected"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while ticks is None or self.tick < ticks:
+            next_tick += self.tick_interval
+            if self.connections:
+                self.step()
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+
+async def serve(server: GameServer, port: int | None = None, unix: str | None = None, host: str = "127.0.0.1"):
+    """listens for clients on a Unix socket (when given) or a TCP port"""
+    if unix:
+        return await asyncio.start_unix_server(server.handle_client, unix)
+    return await asyncio.start_server(server.handle_client, host, port)
+
+
+#
+# a client
+#
+class ClientView:
+    """the world as a client sees it, built from the server's messages"""
+
+    def __init__(self):
+        self.player_id = None
+        self.tick = 0
+        self.level_number = 0
+        self.flags = None
+        self.players = np.zeros(0, PLAYER_DTYPE)
+        self.events = []  # (player id, event name) of every message so far
+
+    def apply(self, message: bytes) -> None:
+        m = decode(message)
+        self.tick = m["tick"]
+        if m["type"] == WELCOME:
+            self.player_id = m["player_id"]
+            return
+        if m["type"] == KEYFRAME:
+            self.level_number = m["level_number"]
+            self.flags = m["flags"].copy()
+        elif self.flags is not None:
+            self.flags.reshape(-1)[m["tiles"]] = m["values"]
+        self.players = m["players"].copy()
+        self.events += [(int(p), EVENTS[e]) for p, e in m["events"].tolist()]
+
+
+async def bot(connect, ticks: int, seed: int, tick_interval: float) -> ClientView:
+    """a loopback client pressing random keys, returns what it saw"""
+    reader, writer = await connect()
+    view = ClientView()
+    rng = np.random.default_rng(seed)
+
+    async def press_keys():
+        while True:
+            writer.write(bytes([rng.integers(len(ACTIONS))]))
+            await asyncio.sleep(tick_interval)
+
+    keys = asyncio.create_task(press_keys())
+    try:
+        while view.tick < ticks:
+            view.apply(await read_message(reader))
+    finally:
+        keys.cancel()
+        writer.close()
+    return view
+
+
+async def load_test(bots: int, ticks: int, seed: int = 0, tick_rate: float = 30) -> dict:
+    """runs a server with `bots` loopback clients on a Unix socket and checks what they saw"""
+    server = GameServer(seed, tick_rate)
+    path = os.path.join(tempfile.mkdtemp(), "wild_west.sock")
+    listener = await serve(server, unix=path)
+    profiler.enable()
+    game = asyncio.create_task(server.run(ticks))
+    start = time.perf_counter()
+    views = await asyncio.gather(*[
+        bot(lambda: asyncio.open_unix_connection(path), ticks, seed + i, server.tick_interval)
+        for i in range(bots)
+    ])
+    elapsed = time.perf_counter() - start
+    await game
+    in_sync = sum(
+        np.array_equal(v.flags, server.wildwest.grid.flags) and np.array_equal(v.players, server.last_players)
+        for v in views
+    )
+    listener.close()
+    os.unlink(path)
+    step = profiler.stats().get("update", {})
+    broadcast = profiler.stats().get("broadcast", {})
+    return {
+        "bots": bots,
+        "ticks": server.tick,
+        "seconds": round(elapsed, 3),
+        "clients_in_sync": in_sync,
+        "bytes_per_client_per_tick": round(server.sent_bytes / max(1, bots * server.tick)),
+        "update_p99_ms": round(step.get("p99", 0), 3),
+        "broadcast_p99_ms": round(broadcast.get("p99", 0), 3),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Wild West multiplayer server")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--tick-rate", type=float, default=3)
+    parser.add_argument("--bots", type=int, help="run a load test with this many loopback clients instead")
+    parser.add_argument("--ticks", type=int, default=300, help="length of the load test")
+    args = parser.parse_args(argv)
+
+    if args.bots:
+        sys.stdout = open(os.devnull, "w")  # the game logic prints every coin pickup
+        report = asyncio.run(load_test(args.bots, args.ticks, args.seed or 0))
+        sys.stdout = sys.__stdout__
+        print(json.dumps(report, indent=2))
+        return
+
+    async def run():
+        server = GameServer(args.seed, args.tick_rate)
+        listener = await serve(server, args.port, args.unix, args.host)
+        async with listener:
+            await server.run()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Occupancy grid for the Wild West game logic
+
+Every tile stores a bitflag of the entity types standing on it,
+so collision and pickup checks are a single array lookup
+instead of a scan over every wall, coin and enemy.
+"""
+import numpy as np
+
+#
+# entity type bitflags
+#
+WALL = 1
+COIN = 2
+CAVE_ENTRANCE = 4
+TRAP = 8
+RIDER_ENEMY = 16
+ENEMY = 32
+BULLET = 64
+ENEMY_BULLET = 128
+
+# riders and enemies can't walk into these
+BLOCKS_WALKERS = WALL | COIN | CAVE_ENTRANCE | RIDER_ENEMY | ENEMY
+# bullets fly over everything except these
+BLOCKS_BULLETS = WALL | CAVE_ENTRANCE
+# at most one of these stands on a tile, so the grid keeps its id
+HAS_ID = COIN | RIDER_ENEMY | ENEMY
+# many of these can share a tile, so the grid counts them
+COUNTED = (BULLET, ENEMY_BULLET)
+
+
+class OccupancyGrid:
+    """
+    Bitflags of the entity types on each tile plus an id map.
+
+    Coins, riders and enemies never share a tile, so `ids` keeps
+    the store slot of the one standing on a tile (or -1).
+    Bullets are counted per tile, their flag is set while
+    the count is above zero.
+    """
+
+    def __init__(self, xsize: int, ysize: int):
+        self.xsize = xsize
+        self.ysize = ysize
+        self.flags = np.zeros((ysize, xsize), np.uint8)
+        self.ids = np.full((ysize, xsize), -1, np.int32)
+        self.counts = {flag: np.zeros((ysize, xsize), np.uint16) for flag in COUNTED}
+        self.origin = self  # the live grid, frozen copies point back to it
+
+    def frozen(self) -> "OccupancyGrid":
+        """
+        a read-only copy of the flags for another thread to draw from,
+        without the ids and counts
+        """
+        copy = OccupancyGrid.__new__(OccupancyGrid)
+        copy.xsize, copy.ysize = self.xsize, self.ysize
+        copy.flags = self.flags.copy()
+        copy.flags.flags.writeable = False
+        copy.ids = None
+        copy.counts = {}
+        copy.origin = self.origin
+        return copy
+
+    def add(self, x: int, y: int, flag: int, entity_id: int = -1) -> None:
+        self.flags[y, x] |= flag
+        if flag & HAS_ID:
+            self.ids[y, x] = entity_id
+        elif flag in self.counts:
+            self.counts[flag][y, x] += 1
+
+    def remove(self, x: int, y: int, flag: int) -> None:
+        if flag in self.counts:
+            counts = self.counts[flag]
+            counts[y, x] -= 1
+            if counts[y, x]:
+                return
+        self.flags[y, x] &= 0xFF ^ flag
+        if flag & HAS_ID:
+            self.ids[y, x] = -1
+
+    def move(self, old_x: int, old_y: int, x: int, y: int, flag: int) -> None:
+        entity_id = self.ids[old_y, old_x]
+        self.remove(old_x, old_y, flag)
+        self.add(x, y, flag, entity_id)
+
+    def add_many(self, x: np.ndarray, y: np.ndarray, flag: int, entity_ids: np.ndarray) -> None:
+        """add() for many entities at once, only counted ones may share a tile"""
+        # flat indices, fancy indexing with one index array is much faster than with two
+        tiles = y * self.xsize + x
+        if flag in self.counts:
+            np.add.at(self.counts[flag].reshape(-1), tiles, np.uint16(1))
+        self.flags.reshape(-1)[tiles] |= flag
+        if flag & HAS_ID:
+            self.ids.reshape(-1)[tiles] = entity_ids
+
+    def remove_many(self, x: np.ndarray, y: np.ndarray, flag: int) -> None:
+        tiles = y * self.xsize + x
+        if flag in self.counts:
+            counts = self.counts[flag].reshape(-1)
+            np.subtract.at(counts, tiles, np.uint16(1))
+            # keep the flag where other entities of this kind are left
+            tiles = tiles[counts[tiles] == 0]
+        self.flags.reshape(-1)[tiles] &= 0xFF ^ flag
+        if flag & HAS_ID:
+            self.ids.reshape(-1)[tiles] = -1
+
+    def has(self, x: int, y: int, flag: int) -> bool:
+        return bool(self.flags[y, x] & flag)
+
+    def get_id(self, x: int, y: int) -> int:
+        return int(self.ids[y, x])
+
+    def inside(self, x: int, y: int) -> bool:
+        return 0 <= x < self.xsize and 0 <= y < self.ysize
+
+    def window(self, x0: int, y0: int, x1: int, y1: int) -> tuple[slice, slice]:
+        """row and column slices of the tiles x0 <= x < x1, y0 <= y < y1 that are on the map"""
+        return (
+            slice(max(0, y0), max(0, min(self.ysize, y1))),
+            slice(max(0, x0), max(0, min(self.xsize, x1))),
+        )
@@ -0,0 +1,118 @@
+"""
+Per-phase frame timing for the Wild West game loop
+
+Wrap a phase of the loop in `with profiler.phase("draw"):` to record how
+long it takes. The last samples of every phase are kept for rolling
+p50/p95/p99 statistics, which can be shown on screen or saved as JSON/CSV.
+
+The profiler is off unless the WILD_WEST_PROFILE environment variable is
+set or enable() is called. While off, phase() hands out one shared no-op
+context manager, so the instrumentation can stay in the code.
+"""
+import csv
+import json
+import os
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+WINDOW = 2000  # samples kept per phase
+PERCENTILES = (50, 95, 99)
+# histogram bucket edges in milliseconds
+HISTOGRAM_EDGES_MS = [0, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000, float("inf")]
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _PhaseTimer:
+    __slots__ = ("samples", "start")
+
+    def __init__(self, samples: deque):
+        self.samples = samples
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(perf_counter() - self.start)
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class PhaseProfiler:
+    """rolling timings of named phases"""
+
+    def __init__(self, window: int = WINDOW, enabled: bool = False):
+        self.window = window
+        self.enabled = enabled
+        self.timers: dict[str, _PhaseTimer] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def phase(self, name: str):
+        """context manager timing one run of the phase `name`"""
+        if not self.enabled:
+            return _NO_TIMER
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = _PhaseTimer(deque(maxlen=self.window))
+        return timer
+
+    def stats(self) -> dict[str, dict]:
+        """count, mean, percentiles and max of every phase in milliseconds"""
+        result = {}
+        # phases may be timed on other threads meanwhile
+        for name, timer in list(self.timers.items()):
+            samples = list(timer.samples)
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000.0
+            entry = {"count": len(ms), "mean": float(ms.mean())}
+            for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                entry[f"p{p}"] = float(value)
+            entry["max"] = float(ms.max())
+            entry["histogram"] = np.histogram(ms, HISTOGRAM_EDGES_MS)[0].tolist()
+            result[name] = entry
+        return result
+
+    def overlay_lines(self) -> list[str]:
+        """one short line per phase for drawing on screen"""
+        return [
+            f"{name:<14} p50 {s['p50']:6.2f}  p95 {s['p95']:6.2f}  p99 {s['p99']:6.2f} ms"
+            for name, s in self.stats().items()
+        ]
+
+    def save(self, filename: str) -> None:
+        """writes the statistics as .json (with histograms) or .csv"""
+        stats = self.stats()
+        if filename.endswith(".csv"):
+            columns = ["count", "mean"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+            with open(filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["phase"] + columns)
+                for name, s in stats.items():
+                    writer.writerow([name] + [s[c] for c in columns])
+        else:
+            with open(filename, "w") as f:
+                json.dump({"histogram_edges_ms": HISTOGRAM_EDGES_MS[:-1], "phases": stats}, f, indent=2)
+
+
+# the profiler shared by the game loop and the game logic
+profiler = PhaseProfiler(enabled=bool(os.environ.get("WILD_WEST_PROFILE")))
@@ -0,0 +1,274 @@
+"""
+Tile renderer for the Wild West graphics engine
+
+A camera follows the player over maps of any size. When the camera
+scrolls, the part of the screen that stays visible is moved, and every
+frame only the tiles whose contents changed since the last frame are
+redrawn. The HUD text is only rasterized again when health or coins
+change.
+
+Sprites are alpha blended, so objects on the same tile stay visible on
+top of each other, in the order of STATIC_LAYER and MOVING_LAYERS. Their
+premultiplied colors are worked out once when the renderer is made. What
+a tile shows depends only on its grid flags, so the image of every
+combination of flags is blended once, all new ones in one batch, and
+drawing the changed tiles of a frame is a single copy out of those
+images.
+"""
+import numpy as np
+import cv2
+from assets import get_image, IMREAD_UNCHANGED
+from occupancy import WALL, COIN, CAVE_ENTRANCE, TRAP, RIDER_ENEMY, ENEMY, BULLET, ENEMY_BULLET
+
+# image file of every object type from get_objects()
+SPRITES = {
+    "player": "player1.png",
+    "cactus": "cactus.png",
+    "coin": "money.png",
+    "cave_entrance": "cave.png",
+    "trap": "trap.png",
+    "bullet": "bullet.png",
+    "enemy_bullet": "bullet.png",
+    "rider enemy": "rider_enemy.png",
+    "enemy": "enemy.png",
+}
+
+# grid flags of the static level layer and the sprite drawn for them, bottom to top
+STATIC_LAYER = [(CAVE_ENTRANCE, "cave_entrance"), (TRAP, "trap"), (WALL, "cactus")]
+# the player's bit in the per-tile keys, next to the grid flags
+PLAYER = 256
+# key of screen tiles beyond the edge of the map
+OUTSIDE = 512
+# moving objects drawn on top of the static layer, bottom to top: bullets fly over everybody
+MOVING_LAYERS = [
+    (COIN, "coin"),
+    (RIDER_ENEMY, "rider enemy"),
+    (ENEMY, "enemy"),
+    (PLAYER, "player"),
+    (ENEMY_BULLET, "enemy_bullet"),
+    (BULLET, "bullet"),
+]
+# the flags that change what a tile looks like
+LAYER_FLAGS = sum(flag for flag, _ in STATIC_LAYER + MOVING_LAYERS)
+
+BACKGROUND_COLOR = (165, 213, 250)  # OpenCV uses the BGR color space by default
+# the sprite files are opaque, painted on BACKGROUND_COLOR; pixels around the sprite closer to it
+# than MATTE_LOW (largest channel difference) are transparent, from MATTE_HIGH on opaque
+MATTE_LOW, MATTE_HIGH = 4, 32
+HUD_FONT = cv2.FONT_HERSHEY_SIMPLEX
+HUD_WIDTH, HUD_HEIGHT = 320, 72
+
+
+def load_sprites() -> dict[str, np.ndarray]:
+    """
+    Reads the image of every object type through the asset cache, with its alpha channel.
+    If an image file does not exist, an error is created.
+    """
+    return {name: get_image(filename, IMREAD_UNCHANGED) for name, filename in SPRITES.items()}
+
+
+def matte(image: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    premultiplied color (0..255) and transparency (1 - alpha) of a sprite as float32,
+    a sprite without transparent pixels has its backdrop keyed out
+    """
+    color = image[:, :, :3].astype(np.float32)
+    if image.shape[2] == 4 and (image[:, :, 3] < 255).any():
+        alpha = image[:, :, 3:].astype(np.float32) / 255
+        return color * alpha, 1 - alpha
+    background = np.array(BACKGROUND_COLOR, np.float32)
+    distance = np.abs(color - background).max(axis=2)
+    alpha = np.clip((distance - MATTE_LOW) / (MATTE_HIGH - MATTE_LOW), 0, 1)
+    # only the backdrop connected to the border, not the parts of the sprite that have its color
+    _, labels = cv2.connectedComponents((distance < MATTE_HIGH).astype(np.uint8), connectivity=4)
+    border = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+    alpha[~np.isin(labels, border[border > 0])] = 1
+    alpha = alpha[:, :, np.newaxis]
+    # the edge pixels are mixed with the backdrop, take it out again
+    return np.clip(color - background * (1 - alpha), 0, 255 * alpha), 1 - alpha
+
+
+def tiles(image: np.ndarray, tile_size: int) -> np.ndarray:
+    """a (rows, columns, tile_size, tile_size, ...) view of the whole tiles of an image"""
+    rows, cols = image.shape[0] // tile_size, image.shape[1] // tile_size
+    s0, s1 = image.strides[:2]
+    return np.lib.stride_tricks.as_strided(
+        image,
+        (rows, cols, tile_size, tile_size) + image.shape[2:],
+        (s0 * tile_size, s1 * tile_size, s0, s1) + image.strides[2:],
+    )
+
+
+def _shift(a: np.ndarray, dx: int, dy: int) -> None:
+    """moves the contents of a by (-dx, -dy), the uncovered part keeps its old values"""
+    h, w = a.shape[:2]
+    src = a[max(0, dy):h + min(0, dy), max(0, dx):w + min(0, dx)].copy()
+    a[max(0, -dy):h + min(0, -dy), max(0, -dx):w + min(0, -dx)] = src
+
+
+class Renderer:
+    """
+    draws the part of the map around the player and keeps the frame
+    between draws, so only what changed is drawn again
+
+    Everything on screen is looked up in the occupancy grid under the
+    camera, so the cost of a frame depends on the screen size only.
+    """
+
+    def __init__(self, images: dict[str, np.ndarray], screen_size: tuple[int, int] = (640, 640), tile_size: int = 64):
+        self.images = images
+        self.sprites = {name: matte(image) for name, image in images.items()}
+        self.screen_x, self.screen_y = screen_size
+        self.tile_size = tile_size
+        self.view_x = self.screen_x // tile_size  # screen size in tiles
+        self.view_y = self.screen_y // tile_size
+        self.scene = np.zeros((self.screen_y, self.screen_x, 3), np.uint8)  # all objects on the background
+        self.frame = np.zeros_like(self.scene)  # scene plus HUD, what is shown
+        # the same images as (view_y, view_x, tile_size, tile_size, 3) tiles
+        self.scene_tiles = tiles(self.scene, tile_size)
+        self.frame_tiles = tiles(self.frame, tile_size)
+        # every tile image blended so far, and its index by the grid flags (plus PLAYER) it shows, -1: not yet
+        self.tile_index = np.full(LAYER_FLAGS + 1, -1, np.intp)
+        self.tile_images = np.zeros((0, tile_size, tile_size, 3), np.uint8)
+        self.grid = None  # grid of the level on screen
+        self.level = None  # the live grid of that level, frozen copies of it count as the same level
+        self.camera = (0, 0)  # map tile in the top left corner
+        self.keys = None  # grid flags (plus PLAYER) each screen tile shows
+        self.hud = None  # (health, coins) currently rasterized
+        self.hud_alpha = None
+
+    def start_level(self, wildwest) -> None:
+        """blends the tiles of the new level ahead of time, the whole screen is drawn on the next draw()"""
+        self.grid = wildwest.grid
+        self.level = wildwest.grid.origin
+        self.camera = self.follow(wildwest.player.position)
+        self._tiles_for(np.unique(self.grid.flags).astype(np.int16))
+        self.keys = np.full((self.view_y, self.view_x), -1, np.int16)  # everything needs drawing
+        self.hud = None
+
+    def follow(self, position) -> tuple[int, int]:
+        """camera position that centers the player without showing beyond the map"""
+        cx = position.x - self.view_x // 2
+        cy = position.y - self.view_y // 2
+        cx = max(0, min(cx, self.grid.xsize - self.view_x))
+        cy = max(0, min(cy, self.grid.ysize - self.view_y))
+        return cx, cy
+
+    def _blend(self, keys: np.ndarray) -> np.ndarray:
+        """
+        the tile images of the keys: the sprites of every layer in them blended
+        over the background, bottom to top, one layer at a time for all tiles at once
+        """
+        t = self.tile_size
+        out = np.empty((len(keys), t, t, 3), np.float32)
+        out[:] = BACKGROUND_COLOR
+        for flag, name in STATIC_LAYER + MOVING_LAYERS:
+            has = (keys & flag) != 0
+            if has.any():
+                premultiplied, transparency = self.sprites[name]
+                out[has] = premultiplied + out[has] * transparency
+        return np.round(out).astype(np.uint8)
+
+    def _tiles_for(self, keys: np.ndarray) -> np.ndarray:
+        """indexes into tile_images of the keys, blending the images not seen before"""
+        keys = keys & LAYER_FLAGS
+        index = self.tile_index[keys]
+        new = index < 0
+        if new.any():
+            missing = np.unique(keys[new])
+            self.tile_index[missing] = np.arange(len(self.tile_images), len(self.tile_images) + len(missing))
+            self.tile_images = np.concatenate([self.tile_images, self._blend(missing)])
+            index = self.tile_index[keys]
+        return index
+
+    def _scroll(self, camera: tuple[int, int]) -> None:
+        """moves the camera, reusing the part of the screen that stays visible"""
+        dx, dy = camera[0] - self.camera[0], camera[1] - self.camera[1]
+        self.camera = camera
+        if abs(dx) >= self.view_x or abs(dy) >= self.view_y:
+            self.keys[:] = -1
+            return
+        t = self.tile_size
+        for a, scale in ((self.scene, t), (self.keys, 1)):
+            _shift(a, dx * scale, dy * scale)
+        # the tiles that scrolled into view
+        if dx:
+            tx0 = self.view_x - dx if dx > 0 else 0
+            self.keys[:, tx0:tx0 + abs(dx)] = -1
+        if dy:
+            ty0 = self.view_y - dy if dy > 0 else 0
+            self.keys[ty0:ty0 + abs(dy), :] = -1
+
+    def _view_keys(self, player) -> np.ndarray:
+        """grid flags of every screen tile, with the PLAYER bit where the player is"""
+        keys = np.full((self.view_y, self.view_x), OUTSIDE, np.int16)
+        cx, cy = self.camera
+        rows, cols = self.grid.window(cx, cy, cx + self.view_x, cy + self.view_y)
+        keys[: rows.stop - rows.start, : cols.stop - cols.start] = self.grid.flags[rows, cols]
+        px, py = player.x - cx, player.y - cy
+        if 0 <= px < self.view_x and 0 <= py < self.view_y:
+            keys[py, px] |= PLAYER
+        return keys
+
+    def _hud_box(self) -> tuple[slice, slice]:
+        return slice(0, HUD_HEIGHT), slice(self.screen_x - HUD_WIDTH, self.screen_x)
+
+    def _rasterize_hud(self, health: int, coins: int) -> None:
+        """draws the HUD text once into an alpha mask"""
+        mask = np.zeros((HUD_HEIGHT, HUD_WIDTH), np.uint8)
+        # Display player's health in the top right corner
+        health_text = f"Health: {health}"
+        text_size = cv2.getTextSize(health_text, HUD_FONT, 1, 2)[0]
+        text_x = HUD_WIDTH - text_size[0] - 10
+        text_y = 30
+        cv2.putText(mask, health_text, (text_x, text_y), HUD_FONT, 1, 255, 2, cv2.LINE_AA)
+        # Display player's coins below health
+        coins_text = f"Coins: {coins}"
+        coins_text_size = cv2.getTextSize(coins_text, HUD_FONT, 1, 2)[0]
+        coins_text_x = HUD_WIDTH - coins_text_size[0] - 10
+        coins_text_y = text_y + text_size[1] + 10  # Add a small margin below the health text
+        cv2.putText(mask, coins_text, (coins_text_x, coins_text_y), HUD_FONT, 1, 255, 2, cv2.LINE_AA)
+        self.hud_alpha = (1.0 - mask / 255.0)[:, :, np.newaxis].astype(np.float32)
+        self.hud = (health, coins)
+
+    def draw(self, wildwest) -> bool:
+        """
+        brings the frame up to date with the world under the camera,
+        returns False if the frame did not change at all
+        """
+        if wildwest.grid.origin is not self.level:
+            self.start_level(wildwest)
+        self.grid = wildwest.grid
+        player = wildwest.player
+        hud = (player.health, player.coins)
+        hud_dirty = self.hud != hud
+
+        camera = self.follow(player.position)
+        scrolled = camera != self.camera
+        if scrolled:
+            self._scroll(camera)
+
+        keys = self._view_keys(player.position)
+        box_y, box_x = self._hud_box()
+        dirty_y, dirty_x = np.nonzero(keys != self.keys)
+        if len(dirty_x):
+            # every changed tile in one go
+            index = self._tiles_for(keys[dirty_y, dirty_x])  # may add to tile_images
+            images = self.tile_images[index]
+            self.scene_tiles[dirty_y, dirty_x] = images
+            if not scrolled:
+                self.frame_tiles[dirty_y, dirty_x] = images
+                t = self.tile_size
+                if ((dirty_y * t < box_y.stop) & ((dirty_x + 1) * t > box_x.start)).any():
+                    hud_dirty = True
+        self.keys = keys
+        if scrolled:
+            self.frame[:] = self.scene
+            hud_dirty = True
+
+        if hud_dirty:
+            if self.hud != hud:
+                self._rasterize_hud(*hud)
+            # black text: darken the scene under the text mask
+            self.frame[box_y, box_x] = self.scene[box_y, box_x] * self.hud_alpha
+        return len(dirty_x) > 0 or hud_dirty
@@ -0,0 +1,143 @@
+"""
+Recording and replaying games
+
+A game only depends on the seed of its WildWest and on what the player
+did at which tick, so a recording is just that: the seed, the actions
+fed to move_command with their tick, and a hash of the world every
+CHECKPOINT_TICKS ticks. replay() plays a recording headless as fast as
+the CPU goes and checks the hashes on the way, so a recording attached
+to a bug report becomes an exact regression test:
+
+    python replay.py bug.json
+    python replay.py bug.json --profile    # per-phase timings of the run
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+
+from game_logic import new_game, move_command, update
+from profiling import profiler
+from snapshots import SnapshotRing, snapshot
+
+CHECKPOINT_TICKS = 30  # 10 seconds at 3 ticks per second
+VERSION = 2
+
+
+class ReplayDiverged(AssertionError):
+    """the replayed world does not match the recording"""
+
+
+def state_hash(wildwest) -> str:
+    """hash of the complete state of the world, see snapshots.snapshot()"""
+    return hashlib.blake2b(snapshot(wildwest), digest_size=16).hexdigest()
+
+
+class InputRecorder:
+    """
+    records what the player does in a game started with new_game(seed)
+
+    Call move() or rewind() whenever the game does that,
+    and tick() after every update().
+    """
+
+    def __init__(self, wildwest, checkpoint_ticks: int = CHECKPOINT_TICKS):
+        self.seed = wildwest.seed
+        self.checkpoint_ticks = checkpoint_ticks
+        # [tick, "move", action], [tick, "rewind", steps] or [tick, "hash", state hash]
+        self.events = []
+
+    def move(self, wildwest, action: str) -> None:
+        self.events.append([wildwest.tick, "move", action])
+
+    def rewind(self, wildwest, steps: int) -> None:
+        """call before SnapshotRing.rewind()"""
+        self.events.append([wildwest.tick, "rewind", steps])
+
+    def tick(self, wildwest) -> None:
+        if wildwest.tick % self.checkpoint_ticks == 0:
+            self.events.append([wildwest.tick, "hash", state_hash(wildwest)])
+
+    def to_dict(self, wildwest) -> dict:
+        """the recording up to now, ending with the hash of the current world"""
+        events = self.events + [[wildwest.tick, "hash", state_hash(wildwest)]]
+        return {"version": VERSION, "seed": self.seed, "events": events}
+
+    def save(self, filename: str, wildwest) -> None:
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(wildwest), f)
+
+
+def replay(recording: dict, check: bool = True) -> dict:
+    """
+    plays a recording without a window, the same way the game loop does:
+    every tick update() runs, then the world goes into the rewind history,
+    and the actions of the tick happen after that.
+
+    Raises ReplayDiverged at the first checkpoint where the world differs.
+    """
+    if recording.get("version") != VERSION:
+        raise ValueError(f"recording version {recording.get('version')}, expected {VERSION}")
+    wildwest = new_game(recording["seed"])
+    history = SnapshotRing()
+    checkpoints = 0
+    start = time.perf_counter()
+    for tick, kind, value in recording["events"]:
+        while wildwest.tick < tick:
+            with profiler.phase("update"):
+                update(wildwest)
+            with profiler.phase("snapshot"):
+                history.push(wildwest)
+        if kind == "move":
+            with profiler.phase("move_command"):
+                move_command(wildwest, wildwest.player, value)
+            if "new level" in wildwest.drain_events():
+                history.clear()
+        elif kind == "rewind":
+            history.rewind(wildwest, value)
+        elif kind == "hash" and check:
+            if state_hash(wildwest) != value:
+                raise ReplayDiverged(f"the world differs from the recording at tick {tick}")
+            checkpoints += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "ticks": wildwest.tick,
+        "checkpoints": checkpoints,
+        "seconds": round(elapsed, 3),
+        "ticks_per_second": round(wildwest.tick / elapsed) if elapsed else 0,
+        "event": wildwest.event,
+        "level_number": wildwest.level_number,
+        "coins": wildwest.player.coins,
+        "health": wildwest.player.health,
+    }
+
+
+def load_recording(filename: str) -> dict:
+    with open(filename) as f:
+        return json.load(f)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded Wild West game and check it")
+    parser.add_argument("recording")
+    parser.add_argument("--no-check", action="store_true", help="don't compare the world hashes")
+    parser.add_argument("--profile", action="store_true", help="print per-phase timings")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profiler.enable()
+    try:
+        result = replay(load_recording(args.recording), check=not args.no_check)
+    except ReplayDiverged as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+    if args.profile:
+        for line in profiler.overlay_lines():
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
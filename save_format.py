@@ -0,0 +1,53 @@
+"""
+Saved games of Wild West
+
+The pydantic models describe a game for loading and saving, see
+WildWest.to_model() and from_model(). pydantic takes a while to import
+and to build the models, so only saving and loading imports this module.
+"""
+from pydantic import BaseModel
+
+from game_logic import ENEMY_HEALTH, PLAYER_HEALTH
+
+
+class Position(BaseModel):
+    x: int
+    y: int
+
+
+class Player(BaseModel):
+    position: Position
+    health: int = PLAYER_HEALTH
+    coins: int = 0
+    last_direction: str = "up"
+
+class Bullet(BaseModel):
+    position: Position
+    direction: str
+
+class EnemyBullet(BaseModel): #separate class for enemy bullets
+    position: Position
+    direction: str
+
+class Enemy (BaseModel):
+    health: int = ENEMY_HEALTH
+    position: Position
+    direction: str = "up"
+    shoot_counter: int = 0
+    last_direction: str = "up"  # Track the last direction moved
+
+class WildWestState(BaseModel):
+    player: Player
+    walls: list[Position] = []
+    coins: list[Position] = []
+    cave_entrances: list[Position] = []
+    traps: list[Position] = []
+    bullets: list[Bullet] = []
+    enemy_bullets: list[EnemyBullet] = []
+    rider_enemies: list[Position] = []
+    enemies: list[Enemy] = []
+
+    event: str = ""
+    level_number: int = 0
+    xsize: int = 10
+    ysize: int = 10
@@ -0,0 +1,196 @@
+"""
+The simulation thread of the windowed game
+
+The world is updated on its own thread, so drawing, cutscenes and slow
+frames never hold up a tick and a slow tick never holds up a frame.
+After every tick and every player action the thread publishes a
+RenderState: a frozen copy of the grid flags and the player, made
+aside and then swapped in as `front` in one step. The window thread
+only ever reads `front`, so it never waits and never sees a
+half-updated world.
+
+The window thread sends the player's actions through a queue. What
+happens in the world (game_logic.EVENTS) comes back through a bounded
+queue, in order and without losing any: when the queue is full the
+simulation waits for the window thread to drain it. After an event
+that ends or changes the level the simulation pauses until resume(),
+so the cutscene is not played over a running game.
+"""
+import queue
+import threading
+from typing import NamedTuple
+
+from game_clock import FixedTimestep
+from game_logic import GAME_FLOW_EVENTS, Player, move_command, update
+from occupancy import OccupancyGrid
+from profiling import profiler
+from replay import InputRecorder
+from snapshots import SnapshotRing, save_snapshot
+
+EVENT_QUEUE_SIZE = 256
+MAX_STEPS = 5  # catch-up limit when the simulation falls behind
+REWIND = "rewind"  # the action that goes back rewind_ticks ticks
+
+
+class RenderState(NamedTuple):
+    """one published state of the world, never changed after publishing"""
+    version: int  # counts the published states, the frame needs drawing when it changed
+    tick: int
+    level_number: int
+    grid: OccupancyGrid  # frozen, see OccupancyGrid.frozen()
+    player: Player
+
+
+class Simulation:
+    """
+    runs a WildWest at `tick_rate` ticks per second on a thread of its own,
+    with the rewind history, the input recording and the autosave
+    """
+
+    def __init__(
+        self,
+        wildwest,
+        tick_rate: float,
+        rewind_ticks: int = 0,
+        autosave_ticks: int = 0,
+        autosave_file: str | None = None,
+    ):
+        self.wildwest = wildwest
+        self.tick_rate = tick_rate
+        self.rewind_ticks = rewind_ticks
+        self.autosave_ticks = autosave_ticks
+        self.autosave_file = autosave_file
+        self.history = SnapshotRing()  # the last ticks for rewinding
+        self.recorder = InputRecorder(wildwest)
+        self.actions = queue.Queue()
+        self.events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.running = threading.Event()  # cleared while paused
+        self.running.set()
+        self.stopping = False
+        self.version = 0
+        self.front = self._render_state()
+        self.thread = None
+
+    #
+    # called from the window thread
+    #
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+        self.thread.start()
+
+    def send(self, action: str) -> None:
+        """an action for move_command, or REWIND; never blocks"""
+        self.actions.put(action)
+
+    def drain_events(self) -> list[str]:
+        """the events published since the last call, oldest first"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def resume(self) -> None:
+        """continues after a game flow event paused the simulation"""
+        self.running.set()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self.stopping = True
+        self.running.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    #
+    # the simulation thread
+    #
+    def _render_state(self) -> RenderState:
+        wildwest = self.wildwest
+        return RenderState(
+            version=self.version,
+            tick=wildwest.tick,
+            level_number=wildwest.level_number,
+            grid=wildwest.grid.frozen(),
+            player=wildwest.player.model_copy(deep=True),
+        )
+
+    def _publish(self) -> None:
+        self.version += 1
+        self.front = self._render_state()  # the window thread sees the old or the new state, never a mix
+
+    def _forward_events(self) -> None:
+        """moves the world's events into the queue, waiting while it is full"""
+        for event in self.wildwest.drain_events():
+            if event == "new level":
+                self.history.clear()  # no rewinding into the last level
+            if event in GAME_FLOW_EVENTS:
+                self.running.clear()
+            while not self.stopping:
+                try:
+                    self.events.put(event, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def _tick(self) -> None:
+        wildwest = self.wildwest
+        with profiler.phase("update"):
+            update(wildwest)
+        with profiler.phase("snapshot"):
+            self.history.push(wildwest)
+            self.recorder.tick(wildwest)
+            if self.autosave_ticks and wildwest.tick % self.autosave_ticks == 0:
+                save_snapshot(self.autosave_file, wildwest)
+
+    def _act(self, action: str) -> None:
+        wildwest = self.wildwest
+        if action == REWIND:
+            self.recorder.rewind(wildwest, self.rewind_ticks)
+            self.history.rewind(wildwest, self.rewind_ticks)
+            return
+        self.recorder.move(wildwest, action)
+        with profiler.phase("move_command"):
+            move_command(wildwest, wildwest.player, action)
+
+    def _run(self) -> None:
+        clock = FixedTimestep(self.tick_rate, MAX_STEPS)
+        while not self.stopping:
+            if not self.running.is_set():
+                self.running.wait()
+                clock.reset()  # don't catch up on the time spent paused
+                continue
+            steps = clock.steps()
+            for _ in range(steps):
+                self._tick()
+            if steps:
+                self._forward_events()
+                self._publish()
+                if not self.running.is_set():
+                    continue
+            # wait for actions until the next tick is due
+            try:
+                action = self.actions.get(timeout=clock.wait_ms() / 1000)
+            except queue.Empty:
+                continue
+            while True:
+                self._act(action)
+                if action == REWIND:
+                    clock.reset()
+                self._forward_events()
+                if not self.running.is_set():
+                    self._discard_actions()
+                    break
+                try:
+                    action = self.actions.get_nowait()
+                except queue.Empty:
+                    break
+            self._publish()
+
+    def _discard_actions(self) -> None:
+        """drops the keys pressed before a cutscene, the way the cutscene window would have eaten them"""
+        while True:
+            try:
+                self.actions.get_nowait()
+            except queue.Empty:
+                return
@@ -0,0 +1,196 @@
+"""
+Binary snapshots of a running WildWest
+
+snapshot() packs the whole world into bytes: the player, the tick, every
+EntityStore array as it is (slots and free stack included, so a restored
+game continues exactly like the original) and the state of the world's
+random generator. restore() unpacks it, the occupancy grid is rebuilt
+from the stores.
+
+SnapshotRing keeps the last snapshots for rewinding. Only the newest one
+is kept whole, the older ones are stored as the compressed XOR with the
+next newer one, which is almost all zeros from one tick to the next.
+
+For crash recovery, save_snapshot() writes a snapshot to a file without
+ever leaving a half-written file behind.
+"""
+import os
+import struct
+import zlib
+from collections import deque
+
+import numpy as np
+
+import game_logic
+from entities import DIRECTIONS, FIELDS
+from occupancy import OccupancyGrid
+
+MAGIC = b"WWSN"
+VERSION = 2
+# magic, version, tick, level number, map size, player x, y, health, coins and direction,
+# active radius (-1: None), far update interval, length of the event text
+HEADER = struct.Struct("<4sIIIIIiiiiBiII")
+# capacity, free count, limit (0: None) and spawn count of one store
+STORE_HEADER = struct.Struct("<IIIQ")
+# PCG64 state and increment (128 bit each), has_uint32, uinteger
+RNG_STATE = struct.Struct("<16s16sII")
+
+RING_SIZE = 90  # 30 seconds at 3 ticks per second
+COMPRESS_LEVEL = 1  # fast, the XOR of two ticks compresses well anyway
+
+
+class SnapshotError(ValueError):
+    """bytes that are not a snapshot of this version"""
+
+
+def _pack_rng(rng: np.random.Generator) -> bytes:
+    state = rng.bit_generator.state
+    if state["bit_generator"] != "PCG64":
+        raise ValueError(f"can't snapshot a {state['bit_generator']} generator")
+    return RNG_STATE.pack(
+        state["state"]["state"].to_bytes(16, "little"),
+        state["state"]["inc"].to_bytes(16, "little"),
+        state["has_uint32"],
+        state["uinteger"],
+    )
+
+
+def _unpack_rng(data: bytes, offset: int) -> np.random.Generator:
+    state, inc, has_uint32, uinteger = RNG_STATE.unpack_from(data, offset)
+    rng = np.random.default_rng()
+    rng.bit_generator.state = {
+        "bit_generator": "PCG64",
+        "state": {"state": int.from_bytes(state, "little"), "inc": int.from_bytes(inc, "little")},
+        "has_uint32": has_uint32,
+        "uinteger": uinteger,
+    }
+    return rng
+
+
+def snapshot(wildwest) -> bytes:
+    """the complete state of the game as bytes"""
+    player = wildwest.player
+    event = wildwest.event.encode()
+    radius = -1 if wildwest.active_radius is None else wildwest.active_radius
+    parts = [
+        HEADER.pack(
+            MAGIC, VERSION, wildwest.tick, wildwest.level_number,
+            wildwest.grid.xsize, wildwest.grid.ysize,
+            player.position.x, player.position.y, player.health, player.coins,
+            DIRECTIONS.index(player.last_direction),
+            radius, wildwest.far_update_interval, len(event),
+        ),
+        event,
+        _pack_rng(wildwest.rng),
+    ]
+    for store in wildwest.store.values():
+        parts.append(STORE_HEADER.pack(store.capacity, store.free_count, store.limit or 0, store.spawned))
+        parts.extend(getattr(store, name).tobytes() for name in FIELDS)
+        parts.append(store.free.tobytes())
+    return b"".join(parts)
+
+
+def restore(wildwest, data: bytes) -> None:
+    """puts the game back into the state of a snapshot"""
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        raise SnapshotError("not a Wild West snapshot")
+    (_, version, tick, level_number, xsize, ysize, x, y, health, coins,
+     direction, radius, far_update_interval, event_size) = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise SnapshotError(f"snapshot version {version}, expected {VERSION}")
+    offset = HEADER.size
+    event = data[offset:offset + event_size].decode()
+    offset += event_size
+    wildwest.rng = _unpack_rng(data, offset)
+    offset += RNG_STATE.size
+
+    wildwest.tick = tick
+    wildwest.level_number = level_number
+    wildwest.event = event
+    wildwest.active_radius = None if radius < 0 else radius
+    wildwest.far_update_interval = far_update_interval
+    wildwest.player.position = game_logic.Position(x=x, y=y)
+    wildwest.player.health = health
+    wildwest.player.coins = coins
+    wildwest.player.last_direction = DIRECTIONS[direction]
+
+    wildwest.grid = OccupancyGrid(xsize=xsize, ysize=ysize)
+    for kind, store in wildwest.store.items():
+        capacity, store.free_count, limit, store.spawned = STORE_HEADER.unpack_from(data, offset)
+        store.limit = limit or None
+        offset += STORE_HEADER.size
+        for name in FIELDS + ("free",):
+            dtype = getattr(store, name).dtype
+            array = np.frombuffer(data, dtype, capacity, offset)
+            setattr(store, name, array.copy())
+            offset += array.nbytes
+        slots = store.slots()
+        wildwest.grid.add_many(store.x[slots], store.y[slots], game_logic.KINDS[kind], slots)
+    wildwest.invalidate()
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    return (np.frombuffer(a, np.uint8) ^ np.frombuffer(b, np.uint8)).tobytes()
+
+
+class SnapshotRing:
+    """
+    the last `size` snapshots, the newest whole and the older ones
+    delta encoded against the next newer snapshot
+    """
+
+    def __init__(self, size: int = RING_SIZE):
+        self.latest = None
+        # (is_delta, compressed bytes) of the older snapshots, oldest first
+        self.older = deque(maxlen=size - 1)
+
+    def __len__(self) -> int:
+        return len(self.older) + (self.latest is not None)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(data) for _, data in self.older) + len(self.latest or b"")
+
+    def push(self, wildwest) -> None:
+        """takes a snapshot of the game, call once per tick"""
+        data = snapshot(wildwest)
+        if self.latest is not None:
+            # a store that grew changes the length, then there is nothing to XOR with
+            if len(self.latest) == len(data):
+                self.older.append((True, zlib.compress(_xor(self.latest, data), COMPRESS_LEVEL)))
+            else:
+                self.older.append((False, zlib.compress(self.latest, COMPRESS_LEVEL)))
+        self.latest = data
+
+    def rewind(self, wildwest, steps: int) -> int:
+        """
+        restores the snapshot `steps` pushes back (as far back as the ring goes),
+        the newer ones are dropped; returns how many steps it went back
+        """
+        if self.latest is None:
+            return 0
+        steps = min(steps, len(self.older))
+        data = self.latest
+        for _ in range(steps):
+            is_delta, packed = self.older.pop()
+            data = _xor(data, zlib.decompress(packed)) if is_delta else zlib.decompress(packed)
+        self.latest = data
+        restore(wildwest, data)
+        return steps
+
+    def clear(self) -> None:
+        self.latest = None
+        self.older.clear()
+
+
+def save_snapshot(filename: str, wildwest) -> None:
+    """writes a snapshot to a file, replacing the old one only once it is complete"""
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(snapshot(wildwest))
+    os.replace(temporary, filename)
+
+
+def load_snapshot(filename: str, wildwest) -> None:
+    with open(filename, "rb") as f:
+        restore(wildwest, f.read())
@@ -0,0 +1,89 @@
+"""
+Startup time of the Wild West modules
+
+Every module is imported in a fresh interpreter, so the report shows
+what each one costs on its own and which heavy libraries it pulls in.
+The modules that only need the game logic must not import cv2, pygame
+or pydantic and must stay within the budget (not counting numpy, which
+all of them need):
+
+    python startup.py
+    python startup.py --budget 60 --json startup.json
+
+python graphics_engine.py --startup-report prints how long the game
+takes until its first frame.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# modules for tools and tests, they must start fast
+LOGIC_MODULES = [
+    "game_logic", "flow_field", "level_files", "snapshots", "replay", "headless",
+    "endless", "simulation", "multiplayer", "benchmark",
+]
+# modules for the window, they may import anything, but not before main() runs
+WINDOW_MODULES = ["graphics_engine", "renderer", "cutscene", "audio", "assets"]
+HEAVY = ("cv2", "pygame", "pydantic")
+BUDGET_MS = 100
+
+# prints the import time in ms and the heavy modules that got imported
+PROBE = """
+import sys, time
+import numpy
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(elapsed, *[name for name in {heavy!r} if name in sys.modules])
+"""
+
+
+def measure(module: str) -> dict:
+    """import time of a module (after numpy) in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return {"module": module, "ms": round(float(output[0]), 1), "heavy": output[1:]}
+
+
+def report(budget_ms: float = BUDGET_MS, repeat: int = 3) -> tuple[list[dict], list[str]]:
+    """the best of `repeat` measurements of every module, and the problems found"""
+    results = []
+    problems = []
+    for module in LOGIC_MODULES + WINDOW_MODULES:
+        runs = [measure(module) for _ in range(repeat)]
+        result = min(runs, key=lambda r: r["ms"])
+        results.append(result)
+        if module in WINDOW_MODULES:
+            if module == "graphics_engine" and result["heavy"]:
+                problems.append(f"importing graphics_engine imports {', '.join(result['heavy'])}")
+            continue
+        if result["heavy"]:
+            problems.append(f"{module} imports {', '.join(result['heavy'])}")
+        if result["ms"] > budget_ms:
+            problems.append(f"{module} takes {result['ms']} ms to import, the budget is {budget_ms} ms")
+    return results, problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Import times of the Wild West modules")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="ms a logic module may take")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results, problems = report(args.budget, args.repeat)
+    for r in results:
+        print(f"{r['module']:<16} {r['ms']:8.1f} ms  {' '.join(r['heavy'])}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"budget_ms": args.budget, "modules": results, "problems": problems}, f, indent=2)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())